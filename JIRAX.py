@@ -1,80 +1,116 @@
-import requests
-from requests.auth import HTTPBasicAuth
 import json
+import math
 import os
-import csv
+import sys
+import argparse
+import contextlib
 from dotenv import load_dotenv
 import re
-from langchain_community.vectorstores import FAISS
-from langchain_ollama import ChatOllama, OllamaEmbeddings
-from langchain_core.prompts import PromptTemplate
-from langchain_core.documents import Document
+import signal
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from templates import PAYLOAD_GENERATION_TEMPLATE_V8 as PAYLOAD_GENERATION_TEMPLATE
-from fetcher_sql import fetch_and_save_issues
+from fetcher_sql import fetch_and_save_issues, PROJECT_KEY, PROJECT_KEYS
+from issue_store import IssueStore, IssueTable, OUTPUT_DB, ISSUE_KEY_PATTERN, project_of
+from vector_index import issue_content, content_hash, recall_report
+from sharded_index import ShardedIndex
+from verdict_cache import VerdictCache, verdict_key
+from clustering import CLUSTER_MAX_SIZE, find_clusters
+from context_builder import build_prompt_context, estimate_tokens
+from run_journal import RunJournal
+from webhook import WebhookServer
+from lexical_index import (
+    LEXICAL_PREFILTER, LEXICAL_DUPLICATE_THRESHOLD, LEXICAL_MAX_CANDIDATES, build_lexical_index, lexical_text,
+)
+import clients
+import jira_client
+import metrics
 load_dotenv()
 JIRA_DOMAIN = os.getenv("JIRA_DOMAIN")
 EMAIL = os.getenv("EMAIL")
 API_TOKEN = os.getenv("API_TOKEN")
-LLM_MODEL = os.getenv("LLM_MODEL", "jirax-pro:latest")
-EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "mxbai-embed-large:latest")
-OUTPUT_FILE = os.getenv("OUTPUT_FILE", "ucm_issues.csv")
-LLM = ChatOllama(model=LLM_MODEL, temperature=0, format="json")
-EMBEDDINGS = OllamaEmbeddings(model=EMBEDDING_MODEL)
-PAYLOAD_PROMPT = PromptTemplate.from_template(PAYLOAD_GENERATION_TEMPLATE)
-MAX_DESCRIPTION_LENGTH = 2000
-
-def load_csv_to_memory():
-    """Carga el CSV en memoria y lo devuelve como un diccionario."""
-    if not os.path.exists(OUTPUT_FILE): return {}
-    data = {}
-    with open(OUTPUT_FILE, mode='r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            key = row.get("key")
-            if key: data[key.strip().upper()] = row
-    return data
-
-def build_vector_store(all_issues_data):
-    """Construye y devuelve una memoria vectorial a partir de los datos de los issues."""
-    print(f"Creating vector store from {len(all_issues_data)} issues...")
-    documents = [
-        Document(
-            page_content=f"Summary: {issue_data.get('summary', '')}\nDescription: {issue_data.get('customfield_10193', '')}",
-            metadata={"key": key}
-        ) for key, issue_data in all_issues_data.items()
-    ]
-    if not documents:
-        return None
-    vector_store = FAISS.from_documents(documents, EMBEDDINGS)
-    print("Vector store created successfully.")
-    return vector_store
+LLM_MODEL = clients.LLM_MODEL
+EMBEDDING_MODEL = clients.EMBEDDING_MODEL
+TEMPLATE_VERSION = content_hash(PAYLOAD_GENERATION_TEMPLATE)[:16]
+TEMPLATE_TOKENS = estimate_tokens(PAYLOAD_GENERATION_TEMPLATE)
+LLM_MAX_IN_FLIGHT = max(1, int(os.getenv("LLM_MAX_IN_FLIGHT", "2")))
+JIRA_WRITE_WORKERS = max(1, int(os.getenv("JIRA_WRITE_WORKERS", "4")))
+LLM_SLOTS = threading.BoundedSemaphore(LLM_MAX_IN_FLIGHT)
+# Proyectos (shards) en los que se buscan duplicados; vacío = todos los de PROJECT_KEYS.
+SEARCH_PROJECTS = [p.strip().upper() for p in os.getenv("SEARCH_PROJECTS", "").split(",") if p.strip()] or None
+# Índice MinHash/LSH de summary + descripción; se construye en initialize() si LEXICAL_PREFILTER.
+LEXICAL_INDEX = None
+# Puerta por distancia (L2 de FAISS, menor = más parecido). Vacío = desactivado.
+SCORE_GATE_MAX_DISTANCE = float(os.getenv("SCORE_GATE_MAX_DISTANCE") or "inf")
+SCORE_GATE_DUPLICATE_DISTANCE = float(os.getenv("SCORE_GATE_DUPLICATE_DISTANCE") or "-inf")
+NO_DUPLICATES_MESSAGE = "✔️ No duplicates detected"
+WATCH_INTERVAL = float(os.getenv("WATCH_INTERVAL", "60"))
+WATCH_WEBHOOK_PORT = int(os.getenv("WATCH_WEBHOOK_PORT", "0"))  # 0 = sin webhook
+# Cada cuánto se listan todas las claves de Jira para detectar borrados en modo vigilancia.
+WATCH_PRUNE_INTERVAL = float(os.getenv("WATCH_PRUNE_INTERVAL", "3600"))
+# Margen añadido a la ventana de cada sondeo (minutos desde la última sincronización correcta).
+WATCH_SYNC_MARGIN_MINUTES = float(os.getenv("WATCH_SYNC_MARGIN_MINUTES", "5"))
+# Issues que el agente puede modificar ("*" = todas).
+JIRA_WRITE_ALLOWLIST = {k.strip() for k in os.getenv("JIRA_WRITE_ALLOWLIST", "UCM-62,UCM-64").split(",") if k.strip()}
+PROHIBITED_FIELDS = ["key", "status", "assignee"]
+# Edición masiva (POST /rest/api/3/bulk/issues/fields) para las escrituras con el mismo valor.
+JIRA_BULK_WRITES = os.getenv("JIRA_BULK_WRITES", "true").lower() not in ("0", "false", "no")
+JIRA_BULK_MIN_ISSUES = max(2, int(os.getenv("JIRA_BULK_MIN_ISSUES", "2")))
+# Escrituras acumuladas antes de enviar un lote (Jira admite hasta 1000 issues por edición masiva).
+JIRA_BULK_BATCH_SIZE = min(1000, max(1, int(os.getenv("JIRA_BULK_BATCH_SIZE", "100"))))
+JIRA_BULK_POLL_INTERVAL = float(os.getenv("JIRA_BULK_POLL_INTERVAL", "1.0"))
+JIRA_BULK_TIMEOUT = float(os.getenv("JIRA_BULK_TIMEOUT", "300"))
+# Tipo de customfield_10602 para la edición masiva: singleLineTextFields o multilineTextFields.
+JIRA_BULK_TEXT_FIELD_TYPE = os.getenv("JIRA_BULK_TEXT_FIELD_TYPE", "singleLineTextFields")
+JIRA_BULK_NOTIFY = os.getenv("JIRA_BULK_NOTIFY", "false").lower() in ("1", "true", "yes")
+BULK_TASK_DONE_STATUSES = {"COMPLETE", "FAILED", "CANCELLED", "DEAD"}
+# Se desactiva en la primera respuesta 404/405/501 (Jira sin edición masiva).
+BULK_EDIT_AVAILABLE = JIRA_BULK_WRITES
 
-def update_jira_issue_api(issue_key: str, update_payload_str: str) -> str:
-    """Updates a Jira issue using the REST API."""
-    allowed_test_issues = {"UCM-62", "UCM-64"}
-    if issue_key not in allowed_test_issues:
-        return f"Permission Error: Test agent can only modify specified test issues."
+def primary_keys(keys):
+    """Claves del proyecto principal: los demás proyectos solo sirven de referencia para buscar duplicados."""
+    return [key for key in keys if project_of(key) == PROJECT_KEY]
+
+def duplicate_message(similar_keys) -> str:
+    return f"❗ Issue may be repeated or similar to {', '.join(similar_keys)}"
 
+def load_issue_store():
+    """Carga en memoria (por columnas) las columnas del agente; el resto se lee de SQLite bajo demanda."""
+    if not os.path.exists(OUTPUT_DB): return {}
+    with metrics.timer("db_load"):
+        return IssueTable(IssueStore(OUTPUT_DB))
+
+def write_permission_error(issue_key: str):
+    """Mensaje de error si el agente no puede escribir en `issue_key`, o None."""
+    if "*" not in JIRA_WRITE_ALLOWLIST and issue_key not in JIRA_WRITE_ALLOWLIST:
+        return f"Permission Error: Test agent can only modify specified test issues."
     if not all([JIRA_DOMAIN, EMAIL, API_TOKEN]):
         return "Error: Missing Jira credentials."
+    return None
+
+def update_jira_issue_api(issue_key: str, update_payload_str: str) -> str:
+    """Updates a Jira issue using the REST API."""
+    permission_error = write_permission_error(issue_key)
+    if permission_error:
+        return permission_error
 
-    url = f"https://{JIRA_DOMAIN}/rest/api/3/issue/{issue_key}"
+    url = f"{jira_client.base_url()}/rest/api/3/issue/{issue_key}"
     headers = {"Accept": "application/json", "Content-Type": "application/json"}
     try:
         payload = json.loads(update_payload_str)
         fields_to_update = (payload.get("fields") or {}).copy()
         
-        prohibited_fields = ["key", "status", "assignee"]
-        for k in prohibited_fields: fields_to_update.pop(k, None)
+        for k in PROHIBITED_FIELDS: fields_to_update.pop(k, None)
         
         if not fields_to_update:
             return f"Skipped: No valid fields to update for {issue_key}."
 
         jira_payload = {"fields": fields_to_update}
         print(f"SENDING: PUT {url} with Payload: {json.dumps(jira_payload, ensure_ascii=False)}")
-        response = requests.put(
-            url, headers=headers, data=json.dumps(jira_payload),
-            auth=HTTPBasicAuth(EMAIL, API_TOKEN), verify=False, timeout=30
+        response = jira_client.request(
+            "PUT", url, headers=headers, data=json.dumps(jira_payload)
         )
         if response.status_code == 204:
             return f"Success: Issue {issue_key} updated."
@@ -84,151 +120,955 @@ def update_jira_issue_api(issue_key: str, update_payload_str: str) -> str:
     except Exception as e:
         return f"An exception occurred: {e}"
 
+def wait_bulk_task(task_id):
+    """Consulta la tarea de edición masiva hasta que termina; None si vence JIRA_BULK_TIMEOUT."""
+    url = f"{jira_client.base_url()}/rest/api/3/bulk/queue/{task_id}"
+    deadline = time.monotonic() + JIRA_BULK_TIMEOUT
+    while True:
+        response = jira_client.request("GET", url, headers={"Accept": "application/json"})
+        response.raise_for_status()
+        task = response.json()
+        if task.get("status") in BULK_TASK_DONE_STATUSES:
+            return task
+        if time.monotonic() >= deadline:
+            print(f"Bulk edit task {task_id} still {task.get('status')} after {JIRA_BULK_TIMEOUT:.0f}s.")
+            return None
+        time.sleep(JIRA_BULK_POLL_INTERVAL)
+
+def bulk_update_jira_issues(issue_keys, fields):
+    """
+    Aplica los mismos `fields` (de texto) a varias issues con la edición masiva de Jira
+    y espera a que termine la tarea. Devuelve {clave: mensaje} si todas se actualizaron
+    o None si hay que recurrir a PUT individuales: Jira sin edición masiva, campos no
+    admitidos, petición rechazada o fallos parciales (la tarea informa por id, no por
+    clave, así que se reescribe el grupo entero; los PUT son idempotentes).
+    """
+    global BULK_EDIT_AVAILABLE
+    fields = {f: v for f, v in fields.items() if f not in PROHIBITED_FIELDS}
+    if not BULK_EDIT_AVAILABLE or not fields or not all(isinstance(v, str) for v in fields.values()):
+        return None
+
+    url = f"{jira_client.base_url()}/rest/api/3/bulk/issues/fields"
+    headers = {"Accept": "application/json", "Content-Type": "application/json"}
+    bulk_payload = {
+        "selectedIssueIdsOrKeys": list(issue_keys),
+        "selectedActions": list(fields),
+        "editedFieldsInput": {
+            JIRA_BULK_TEXT_FIELD_TYPE: [{"fieldId": f, "text": v} for f, v in fields.items()]
+        },
+        "sendBulkNotification": JIRA_BULK_NOTIFY,
+    }
+    print(f"SENDING: POST {url} for {len(issue_keys)} issue(s) with Fields: {json.dumps(fields, ensure_ascii=False)}")
+    metrics.observe("jira_bulk_size", len(issue_keys))
+    try:
+        response = jira_client.request("POST", url, headers=headers, data=json.dumps(bulk_payload))
+        if response.status_code in (404, 405, 501):
+            print("Bulk edit is not available in this Jira; using per-issue PUT from now on.")
+            BULK_EDIT_AVAILABLE = False
+            metrics.incr("jira_bulk_edits", outcome="unavailable")
+            return None
+        if response.status_code not in (200, 201):
+            print(f"Bulk edit rejected (status {response.status_code}): {response.text}")
+            metrics.incr("jira_bulk_edits", outcome="rejected")
+            return None
+        task = wait_bulk_task(response.json()["taskId"])
+    except Exception as e:
+        print(f"Bulk edit failed ({e}).")
+        metrics.incr("jira_bulk_edits", outcome="error")
+        return None
+    if (task is None or task.get("status") != "COMPLETE" or task.get("failedAccessibleIssues")
+            or task.get("invalidOrInaccessibleIssueCount")):
+        task = task or {"status": "TIMEOUT"}
+        print(
+            f"Bulk edit did not update every issue (status {task.get('status')}, "
+            f"{len(task.get('failedAccessibleIssues') or {})} failed, "
+            f"{task.get('invalidOrInaccessibleIssueCount') or 0} invalid); retrying with per-issue PUT."
+        )
+        metrics.incr("jira_bulk_edits", outcome="partial")
+        return None
+    metrics.incr("jira_bulk_edits", outcome="complete")
+    return {key: f"Success: Issue {key} updated (bulk edit)." for key in issue_keys}
+
+def is_up_to_date(issue_key, fields, all_issues_data):
+    current_issue = all_issues_data.get(issue_key) or {}
+    return bool(fields) and all(f in current_issue and current_issue[f] == v for f, v in fields.items())
+
+def write_issue_update(issue_key: str, update_payload_str: str, all_issues_data) -> str:
+    """
+    Escribe en Jira solo si algún campo cambia respecto a la copia local
+    y, si la escritura tiene éxito, actualiza esa copia.
+    """
+    fields = json.loads(update_payload_str).get("fields") or {}
+    if is_up_to_date(issue_key, fields, all_issues_data):
+        return f"Skipped: {issue_key} already up to date."
+    result = update_jira_issue_api(issue_key, update_payload_str)
+    if result.startswith("Success"):
+        all_issues_data.update_fields(issue_key, fields)
+    return result
+
+class JiraWriteQueue:
+    """
+    Escrituras en Jira en un pool de hilos, serializadas por issue. Con un diario
+    de ejecución, cada resultado queda registrado y no se repiten las escrituras
+    ya completadas con el mismo payload.
+    Con `bulk` (JIRA_BULK_WRITES) las escrituras se acumulan en lotes de
+    JIRA_BULK_BATCH_SIZE; dentro de cada lote, las que llevan exactamente los mismos
+    campos se envían con una sola edición masiva y el resto (o todas, si Jira no
+    la admite) por PUT en el pool. `submit` devuelve igualmente un future por issue.
+    """
+
+    def __init__(self, all_issues_data, workers=None, journal=None, bulk=None):
+        self.all_issues_data = all_issues_data
+        self.journal = journal
+        self.completed = journal.completed() if journal else {}
+        self.writers = [ThreadPoolExecutor(max_workers=1) for _ in range(workers or JIRA_WRITE_WORKERS)]
+        self.bulk = JIRA_BULK_WRITES if bulk is None else bulk
+        self.staged = []
+        self.staged_keys = set()
+        # Un solo hilo envía los lotes, de uno en uno, para conservar el orden por issue.
+        self.batch_writer = ThreadPoolExecutor(max_workers=1) if self.bulk else None
+
+    def _record(self, issue_key, update_payload_str, result):
+        metrics.incr("jira_writes", status=result_status(result))
+        if self.journal:
+            self.journal.record_write(issue_key, update_payload_str, result_status(result), result)
+        return result
+
+    def _write(self, issue_key, update_payload_str):
+        result = write_issue_update(issue_key, update_payload_str, self.all_issues_data)
+        return self._record(issue_key, update_payload_str, result)
+
+    def _writer(self, issue_key):
+        return self.writers[hash(issue_key) % len(self.writers)]
+
+    def submit(self, issue_key, update_payload_str):
+        done = self.completed.get(issue_key)
+        if done and done[1] == update_payload_str:
+            print(f"Resume: {issue_key} already written in this run, skipping.")
+            return issue_key, done[2]
+        if not self.bulk:
+            return issue_key, self._writer(issue_key).submit(self._write, issue_key, update_payload_str)
+        if issue_key in self.staged_keys:
+            # La escritura anterior del mismo issue tiene que llegar antes.
+            self.flush()
+        future = Future()
+        self.staged.append((issue_key, update_payload_str, future))
+        self.staged_keys.add(issue_key)
+        if len(self.staged) >= JIRA_BULK_BATCH_SIZE:
+            self.flush()
+        return issue_key, future
+
+    def flush(self):
+        """Envía las escrituras acumuladas como un lote."""
+        if not self.staged:
+            return
+        batch, self.staged, self.staged_keys = self.staged, [], set()
+        self.batch_writer.submit(self._write_batch, batch)
+
+    def _write_batch(self, batch):
+        try:
+            groups = {}
+            individual = []
+            for issue_key, update_payload_str, future in batch:
+                fields = json.loads(update_payload_str).get("fields") or {}
+                if is_up_to_date(issue_key, fields, self.all_issues_data):
+                    result = f"Skipped: {issue_key} already up to date."
+                    future.set_result(self._record(issue_key, update_payload_str, result))
+                elif write_permission_error(issue_key) or not fields:
+                    individual.append((issue_key, update_payload_str, future))
+                else:
+                    group_key = json.dumps(fields, sort_keys=True, ensure_ascii=False)
+                    groups.setdefault(group_key, []).append((issue_key, update_payload_str, future))
+
+            for group in groups.values():
+                fields = json.loads(group[0][1]).get("fields") or {}
+                results = None
+                if len(group) >= JIRA_BULK_MIN_ISSUES:
+                    results = bulk_update_jira_issues([issue_key for issue_key, _, _ in group], fields)
+                if results is None:
+                    individual.extend(group)
+                    continue
+                for issue_key, update_payload_str, future in group:
+                    self.all_issues_data.update_fields(issue_key, fields)
+                    future.set_result(self._record(issue_key, update_payload_str, results[issue_key]))
+
+            puts = [
+                (future, self._writer(issue_key).submit(self._write, issue_key, update_payload_str))
+                for issue_key, update_payload_str, future in individual
+            ]
+            for future, put in puts:
+                try:
+                    future.set_result(put.result())
+                except Exception as e:
+                    future.set_exception(e)
+        except Exception as e:
+            for _issue_key, _payload, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+    def close(self):
+        if self.bulk:
+            self.flush()
+            self.batch_writer.shutdown(wait=True)
+        for writer in self.writers:
+            writer.shutdown(wait=True)
+
+def result_status(message: str) -> str:
+    if message.startswith("Success"):
+        return "updated"
+    if message.startswith("Skipped:") and message.endswith("already up to date."):
+        return "unchanged"
+    if message.startswith("Skipped"):
+        return "skipped"
+    return "error"
+
+def collect_results(final_results):
+    """
+    Convierte las entradas (clave, mensaje o future) en registros
+    {"key", "status", "message"}, conservando el orden.
+    """
+    results = []
+    for issue_key, outcome in final_results:
+        message = outcome if isinstance(outcome, str) else outcome.result()
+        results.append({"key": issue_key, "status": result_status(message), "message": message})
+    return results
+
+def format_summary(results) -> str:
+    return f"✅ PROCESO COMPLETADO\n\nDetalles:\n- " + "\n- ".join(
+        f"{r['key']}: {r['message']}" for r in results
+    )
+
 def extract_all_issue_keys(text: str, all_known_keys: list) -> list[str]:
     """Extrae claves de issue del texto. Si no hay, devuelve todas las claves conocidas."""
-    matches = re.findall(r'([A-Z]{2,}-\d+)', text.upper())
+    matches = re.findall(ISSUE_KEY_PATTERN, text.upper())
     if not matches:
-        print("No specific issue keys found, targeting ALL known issues.")
+        print(f"No specific issue keys found, targeting ALL known {PROJECT_KEY} issues.")
         return sorted(all_known_keys)
-    return sorted(list(set(matches)))
+    return sorted(primary_keys(set(matches)))
+
+def build_llm_inputs(current_issue, similar_issues, all_issues_data):
+    """
+    Prepara el contexto del issue actual y el de sus vecinos para la plantilla
+    dentro del presupuesto de tokens. `similar_issues` = [(clave, distancia o None)].
+    Devuelve también los pares (clave, hash de contenido) de los vecinos incluidos.
+    """
+    neighbors = [(key, all_issues_data.get(key, {}), distance) for key, distance in similar_issues]
+    clean_current_issue_context, similar_issues_context, included_keys = build_prompt_context(
+        current_issue, neighbors, TEMPLATE_TOKENS
+    )
+    neighbor_data = {key: data for key, data, _distance in neighbors}
+    neighbor_hashes = [(key, content_hash(issue_content(neighbor_data[key]))) for key in included_keys]
+    if not similar_issues_context:
+        similar_issues_context = "No similar issues found in the vector memory."
+    return clean_current_issue_context, similar_issues_context, neighbor_hashes
+
+def payload_prompt():
+    """Plantilla de LangChain del veredicto; se construye en la primera llamada al LLM."""
+    from langchain_core.prompts import PromptTemplate
+    return PromptTemplate.from_template(PAYLOAD_GENERATION_TEMPLATE)
 
+clients.register("payload_prompt", payload_prompt)
+# La caché de veredictos abre (y crea) su base SQLite: solo al analizar, no en `--help` ni `sync`.
+clients.register("verdict_cache", VerdictCache)
+
+def ask_llm_verdict(issue_key, current_issue_context, similar_issues_context, neighbor_hashes):
+    """
+    Obtiene el veredicto de duplicados (caché o LLM) y lo valida.
+    Devuelve (mensaje de error, None) o (None, payload con `customfield_10602`).
+    """
+    cache_key = verdict_key(LLM_MODEL, TEMPLATE_VERSION, current_issue_context, neighbor_hashes)
+    cached_verdict = clients.get("verdict_cache").get(cache_key)
+    if cached_verdict is not None:
+        metrics.incr("verdict_cache", result="hit")
+        print(f"Verdict cache hit for {issue_key}: {cached_verdict}")
+        return None, {"customfield_10602": cached_verdict}
+    metrics.incr("verdict_cache", result="miss")
+
+    metrics.observe(
+        "prompt_tokens_estimated",
+        TEMPLATE_TOKENS + estimate_tokens(current_issue_context) + estimate_tokens(similar_issues_context),
+    )
+    chain = clients.get("payload_prompt") | clients.get("llm")
+    with metrics.timer("llm_slot_wait"):
+        LLM_SLOTS.acquire()
+    try:
+        started = time.perf_counter()
+        llm_response = chain.invoke({
+            "current_issue_data": current_issue_context,
+            "current_issue_key": issue_key,
+            "similar_issues_context": similar_issues_context
+        })
+        llm_seconds = time.perf_counter() - started
+    finally:
+        LLM_SLOTS.release()
+    llm_response_content = llm_response.content
+    record_llm_metrics(llm_response, llm_seconds)
+    print(f"LLM Response for {issue_key}:\n{llm_response_content}")
+    payload_json = None
+
+    try:
+        payload_json = json.loads(llm_response_content)
+    except json.JSONDecodeError:
+
+        metrics.incr("llm_json_fallback")
+        print(f"⚠️ {issue_key}: JSON directo falló, intentando extracción con Regex de respaldo...")
+        match = re.search(r'\{.*\}', llm_response_content, re.DOTALL)
+        if match:
+            try:
+                payload_json = json.loads(match.group(0))
+            except:
+                pass
+
+    if not payload_json:
+        metrics.incr("llm_invalid_json")
+        return "LLM did not generate valid JSON.", None
+
+    duplicate_text = payload_json.get("customfield_10602", "")
+    if not (duplicate_text.strip().startswith("✔️") or duplicate_text.strip().startswith("❗")):
+        error_msg = f"LLM hallucination detected! Invalid format: '{duplicate_text}'"
+        metrics.incr("llm_hallucination_rejects")
+        print(f"ERROR for {issue_key}: {error_msg}")
+        return error_msg, None
+
+    clients.get("verdict_cache").put(cache_key, issue_key, duplicate_text)
+    return None, payload_json
+
+@metrics.timed("analyze_issue")
 def process_single_issue(issue_key: str, all_issues_data: dict, vector_store):
     """
-    Procesa un único issue, consultando al LLM.
-    Devuelve el mensaje de resultado y una LISTA de claves de duplicados encontrados.
+    Procesa un único issue, consultando al LLM (sin escribir en Jira).
+    Devuelve (mensaje, claves de duplicados, payload). Si el payload no es None,
+    el mensaje es None y queda pendiente la escritura en Jira.
     """
     print(f"\n--- Analyzing Issue: {issue_key} ---")
     current_issue = all_issues_data.get(issue_key)
     if not current_issue:
-        return f"{issue_key}: Skipped (not found in local data).", []
+        return "Skipped (not found in local data).", [], None
 
     try:
-        query_content = f"Summary: {current_issue.get('summary', '')}\nDescription: {current_issue.get('customfield_10193', '')}"
-        similar_docs = vector_store.similarity_search(query_content, k=4)
-        similar_issues_context = ""
-        for doc in similar_docs:
-            if doc.metadata["key"] != issue_key:
-                key = doc.metadata["key"]
-                data = all_issues_data.get(key, {})
-                sim_summary = data.get('summary', 'N/A')
-                sim_desc = data.get('customfield_10193', 'N/A')
-                if len(sim_desc) > MAX_DESCRIPTION_LENGTH:
-                    sim_desc = sim_desc[:MAX_DESCRIPTION_LENGTH] + "\n... (CONTENT TRUNCATED)"
-                similar_issues_context += (
-                    f"- ISSUE {key}:\n"
-                    f"  Summary: {sim_summary}\n"
-                    f"  Description: {sim_desc}\n\n"
-                )
-        if not similar_issues_context:
-            similar_issues_context = "No similar issues found in the vector memory."
-        curr_summary = current_issue.get('summary', 'N/A')
-        curr_description = current_issue.get('customfield_10193', 'N/A')
-        
-        if len(curr_description) > MAX_DESCRIPTION_LENGTH:
-            curr_description = curr_description[:MAX_DESCRIPTION_LENGTH] + "\n... (CONTENT TRUNCATED)"
+        lexical_matches = LEXICAL_INDEX.query(issue_key) if LEXICAL_INDEX else []
+        if SEARCH_PROJECTS:
+            lexical_matches = [(k, similarity) for k, similarity in lexical_matches if project_of(k) in SEARCH_PROJECTS]
 
-        clean_current_issue_context = f"Summary: {curr_summary}\nDescription: {curr_description}"
-        
-        chain = PAYLOAD_PROMPT | LLM
-        llm_response_content = chain.invoke({
-            "current_issue_data": clean_current_issue_context,
-            "current_issue_key": issue_key,
-            "similar_issues_context": similar_issues_context
-        }).content
-        print(f"LLM Response for {issue_key}:\n{llm_response_content}")
-        payload_json = None
-        
-        found_dup_keys = []
-        try:
-            payload_json = json.loads(llm_response_content)
-        except json.JSONDecodeError:
-        
-            print(f"⚠️ {issue_key}: JSON directo falló, intentando extracción con Regex de respaldo...")
-            match = re.search(r'\{.*\}', llm_response_content, re.DOTALL)
-            if match:
-                try:
-                    payload_json = json.loads(match.group(0))
-                except:
-                    pass
-        
+        query_content = issue_content(current_issue)
+        # El vector de la consulta ya se calculó al indexar: sale de la caché sin llamar a Ollama.
+        query_vector = clients.get("embeddings").embed_query(query_content)
+        # La búsqueda se reparte entre los shards de SEARCH_PROJECTS. Los ids globales del índice
+        # coinciden con los de la tabla de issues (align_issue_table): el vecino se resuelve por posición.
+        with metrics.timer("similarity_search"):
+            search_results = vector_store.search_ids(query_vector, 4, SEARCH_PROJECTS)
+        neighbors = [(all_issues_data.key_of(issue_id), score) for issue_id, score in search_results]
+        similar_issues = [
+            (key, score) for key, score in neighbors if key != issue_key and score <= SCORE_GATE_MAX_DISTANCE
+        ]
+        obvious_dup_keys = {k for k, similarity in lexical_matches if similarity >= LEXICAL_DUPLICATE_THRESHOLD}
+        if obvious_dup_keys:
+            # Las copias casi literales se suman a los vecinos semánticos seguros, no los sustituyen.
+            dup_keys = sorted(obvious_dup_keys | {k for k, score in similar_issues if score <= SCORE_GATE_DUPLICATE_DISTANCE})
+            metrics.incr("lexical_gate")
+            print(f"Lexical prefilter for {issue_key}: near-verbatim duplicates {dup_keys}, skipping LLM.")
+            return None, dup_keys, json.dumps({"fields": {"customfield_10602": duplicate_message(dup_keys)}})
+        # Los candidatos léxicos que FAISS no devolvió se añaden como vecinos (sin distancia).
+        faiss_keys = {key for key, _score in similar_issues}
+        lexical_neighbors = [(k, None) for k, _similarity in lexical_matches if k not in faiss_keys]
+        lexical_neighbors = lexical_neighbors[:LEXICAL_MAX_CANDIDATES]
+        if lexical_neighbors:
+            metrics.incr("lexical_candidates", len(lexical_neighbors))
+        if not similar_issues and not lexical_neighbors and SCORE_GATE_MAX_DISTANCE != float("inf"):
+            metrics.incr("score_gate", outcome="no_neighbors")
+            print(f"Score gate for {issue_key}: no neighbor within {SCORE_GATE_MAX_DISTANCE}, skipping LLM.")
+            return None, [], json.dumps({"fields": {"customfield_10602": NO_DUPLICATES_MESSAGE}})
+        certain_dup_keys = sorted(key for key, score in similar_issues if score <= SCORE_GATE_DUPLICATE_DISTANCE)
+        if certain_dup_keys:
+            metrics.incr("score_gate", outcome="certain_duplicate")
+            print(f"Score gate for {issue_key}: certain duplicates {certain_dup_keys}, skipping LLM.")
+            return None, certain_dup_keys, json.dumps({"fields": {"customfield_10602": duplicate_message(certain_dup_keys)}})
 
-        if not payload_json:
-            return f"{issue_key}: Skipped (LLM did not generate valid JSON).", []
-        
-        duplicate_text = payload_json.get("customfield_10602", "")
-        if not (duplicate_text.strip().startswith("✔️") or duplicate_text.strip().startswith("❗")):
-            error_msg = f"LLM hallucination detected! Invalid format: '{duplicate_text}'"
-            print(f"ERROR for {issue_key}: {error_msg}")
-            return f"{issue_key}: Skipped ({error_msg})", []
-        
-        found_dup_keys = re.findall(r"([A-Z]{2,}-\d+)", duplicate_text)
+        current_context, similar_issues_context, neighbor_hashes = build_llm_inputs(
+            current_issue,
+            similar_issues + lexical_neighbors,
+            all_issues_data,
+        )
+        error_msg, payload_json = ask_llm_verdict(issue_key, current_context, similar_issues_context, neighbor_hashes)
+        if error_msg:
+            return f"Skipped ({error_msg})", [], None
+
+        found_dup_keys = re.findall(ISSUE_KEY_PATTERN, payload_json["customfield_10602"])
         final_payload_str = json.dumps({"fields": payload_json})
-        api_result_message = update_jira_issue_api(issue_key, final_payload_str)
-        
-        return f"{issue_key}: {api_result_message}", found_dup_keys
+        return None, found_dup_keys, final_payload_str
 
     except Exception as e:
-        return f"Skipped {issue_key}: Unexpected error ({e}).", []
+        return f"Skipped: Unexpected error ({e}).", [], None
 
-def main():
-    """Función principal que inicializa y ejecuta el bucle del agente."""
-    print("--- Jira Autonomous Agent Initializing ---")
-    fetch_and_save_issues()
-    all_issues_data = load_csv_to_memory()
-    if not all_issues_data:
-        print("Error: No issues loaded from CSV. Cannot proceed.")
-        return
-    vector_store = build_vector_store(all_issues_data)
-    if not vector_store:
-        print("Error: Could not build vector store.")
-        return
-    print("\nInitialization complete. Agent is ready.")
-    while True:
-        user_input = input("\n> Which UCM-X (example: UCM-7) issues would you like to process? (If you dont especify UCM, all will be processed):")
-        if user_input.lower() in ['exit', 'quit', 'salir']:
-            break
-        
-        keys_to_process_sorted = extract_all_issue_keys(user_input, list(all_issues_data.keys()))
-        tasks_pending_tracker = set(keys_to_process_sorted) 
-        final_results = []
-        print(f"\n--- 1. Targetting {len(tasks_pending_tracker)} issue(s) for processing ---")
-        
-        for current_key in keys_to_process_sorted:
-            
+def record_llm_metrics(llm_response, llm_seconds):
+    """Latencia, tokens y tokens/s de una respuesta del LLM (con los contadores de Ollama si vienen)."""
+    metrics.observe("llm_call_seconds", llm_seconds)
+    usage = getattr(llm_response, "usage_metadata", None) or {}
+    output_tokens = usage.get("output_tokens") or estimate_tokens(llm_response.content)
+    metrics.observe("llm_output_tokens", output_tokens)
+    if usage.get("input_tokens"):
+        metrics.observe("llm_input_tokens", usage["input_tokens"])
+    eval_ns = (getattr(llm_response, "response_metadata", None) or {}).get("eval_duration")
+    generation_seconds = eval_ns / 1e9 if eval_ns else llm_seconds
+    if generation_seconds > 0:
+        metrics.observe("llm_tokens_per_second", output_tokens / generation_seconds)
+
+def run_analysis(keys_to_process_sorted, all_issues_data, vector_store, journal=None):
+    """
+    Analiza los issues en paralelo y devuelve la lista de resultados.
+    La recuperación y el LLM se ejecutan por adelantado (como mucho LLM_MAX_IN_FLIGHT
+    llamadas al modelo a la vez) pero los resultados se confirman en el orden de
+    `keys_to_process_sorted`, así que la metacognición decide igual que en serie.
+    Las escrituras en Jira van a un pool aparte, serializadas por issue.
+    Con `journal` se registran veredictos y escrituras; al reanudar, los issues ya
+    escritos reutilizan el veredicto guardado y el resto se vuelve a procesar.
+    """
+    tasks_pending_tracker = set(keys_to_process_sorted)
+    final_results = []
+    # Se deja margen para que la recuperación de los siguientes issues avance mientras el LLM trabaja.
+    window = LLM_MAX_IN_FLIGHT * 2
+    analysis_pool = ThreadPoolExecutor(max_workers=window)
+    write_queue = JiraWriteQueue(all_issues_data, journal=journal)
+
+    in_flight = deque()
+    keys_iter = iter(keys_to_process_sorted)
+    try:
+        while True:
+            for current_key in keys_iter:
+                if current_key not in tasks_pending_tracker:
+                    print(f"\n--- Skipping Issue: {current_key} (already resolved by metacognition) ---")
+                    continue
+                if current_key in write_queue.completed:
+                    in_flight.append((current_key, None))
+                else:
+                    in_flight.append((current_key, analysis_pool.submit(
+                        process_single_issue, current_key, all_issues_data, vector_store
+                    )))
+                if len(in_flight) >= window:
+                    break
+            if not in_flight:
+                break
+
+            current_key, future = in_flight.popleft()
             if current_key not in tasks_pending_tracker:
+                # Otro issue anterior lo reclamó para su clúster mientras se analizaba.
+                if future:
+                    future.cancel()
                 print(f"\n--- Skipping Issue: {current_key} (already resolved by metacognition) ---")
-                continue 
-            
-            tasks_pending_tracker.remove(current_key) 
-            
-            result_msg, found_dup_keys_list = process_single_issue(
-                current_key,
-                all_issues_data, 
-                vector_store
-            )
-            
-            final_results.append(result_msg)
+                continue
+            tasks_pending_tracker.remove(current_key)
+
+            if future is None:
+                # Ya completado en la ejecución reanudada: se repiten sus decisiones sin volver a analizar.
+                found_dup_keys_list, payload_str, _message = write_queue.completed[current_key]
+                result_msg = None
+            else:
+                result_msg, found_dup_keys_list, payload_str = future.result()
+                if journal:
+                    status = "pending" if payload_str else result_status(result_msg)
+                    journal.record_verdict(current_key, found_dup_keys_list, payload_str, status, result_msg)
+            if payload_str is None:
+                final_results.append((current_key, result_msg))
+            else:
+                final_results.append(write_queue.submit(current_key, payload_str))
 
             if found_dup_keys_list:
                 full_clúster_keys = {current_key} | set(found_dup_keys_list)
-                
-                for key_to_auto_update in found_dup_keys_list:
+
+                # Los issues de proyectos de referencia solo aparecen en el mensaje; no se escriben.
+                for key_to_auto_update in primary_keys(found_dup_keys_list):
                     others_list = sorted(list(full_clúster_keys - {key_to_auto_update}))
-                    
+
                     tasks_pending_tracker.discard(key_to_auto_update)
-                        
+
                     print(f"\n Metacognition: Proactively updating {key_to_auto_update} as part of clúster")
-                    
+
                     dup_payload_str = json.dumps({
                         "fields": {
-                            "customfield_10602": f"❗ Issue may be repeated or similar to {', '.join(others_list)}"
+                            "customfield_10602": duplicate_message(others_list)
                         }
                     })
-                    dup_result_msg = update_jira_issue_api(key_to_auto_update, dup_payload_str)
-                    final_results.append(f"{key_to_auto_update}: {dup_result_msg}")
+                    if journal and key_to_auto_update not in write_queue.completed:
+                        journal.record_cluster_update(key_to_auto_update, current_key, dup_payload_str)
+                    final_results.append(write_queue.submit(key_to_auto_update, dup_payload_str))
+    finally:
+        analysis_pool.shutdown(wait=True, cancel_futures=True)
+        write_queue.close()
+
+    return collect_results(final_results)
+
+def confirm_cluster(cluster_keys, all_issues_data):
+    """
+    Confirma un clúster candidato con el LLM: el primer issue se compara con el resto
+    en una sola llamada y, si quedan dos o más sin confirmar (p. ej. en una cadena A~B~C
+    cuyo representante es el distinto), el primero de ellos se compara con los demás,
+    hasta agotarlos. Devuelve (mensaje de error, grupos confirmados, claves sin grupo que
+    el LLM no llegó a comparar con todo el clúster).
+    """
+    pending, groups, judged = list(cluster_keys), [], set()
+    while len(pending) >= 2:
+        representative, others = pending[0], pending[1:]
+        print(f"\n--- Confirming cluster {representative} + {len(others)} candidate(s) ---")
+        current_issue = all_issues_data.get(representative)
+        if not current_issue:
+            return f"{representative} not found in local data", [], []
+        try:
+            current_context, similar_issues_context, neighbor_hashes = build_llm_inputs(
+                current_issue, [(key, None) for key in others], all_issues_data
+            )
+            error_msg, payload_json = ask_llm_verdict(
+                representative, current_context, similar_issues_context, neighbor_hashes
+            )
+        except Exception as e:
+            return f"Unexpected error ({e})", [], []
+        if error_msg:
+            return error_msg, [], []
+        judged.update(frozenset((representative, key)) for key in others)
+        found = set(re.findall(ISSUE_KEY_PATTERN, payload_json["customfield_10602"])) & set(others)
+        if found:
+            groups.append(sorted({representative} | found))
+        pending = [key for key in others if key not in found]
+    grouped = {key for group in groups for key in group}
+    unjudged = [
+        key for key in cluster_keys
+        if key not in grouped and any(frozenset((key, other)) not in judged for other in cluster_keys if other != key)
+    ]
+    return None, groups, unjudged
+
+def run_cluster_analysis(all_issues_data, vector_store, journal=None):
+    """
+    Modo por lotes: agrupa todo el corpus con un kNN vectorizado + union-find y
+    confirma cada componente con el LLM una sola vez. Los miembros confirmados
+    se marcan entre sí como duplicados; el resto de issues como únicos.
+    Solo se escriben los issues del proyecto principal; los de otros proyectos
+    únicamente aparecen como duplicados de estos. Los componentes de más de
+    CLUSTER_MAX_SIZE issues, y los miembros sin grupo que el LLM no comparó con todo
+    su componente, se analizan después issue a issue con run_analysis().
+    Con `journal`, al reanudar no se repiten las escrituras ya completadas.
+    """
+    clusters = [c for c in find_clusters(vector_store) if primary_keys(c)]
+    oversized = [c for c in clusters if len(c) > CLUSTER_MAX_SIZE]
+    clusters = [c for c in clusters if len(c) <= CLUSTER_MAX_SIZE]
+    oversized_keys = {key for cluster_keys in oversized for key in cluster_keys}
+    print(f"\n--- Found {len(clusters)} candidate cluster(s) ---")
+    final_results = []
+    write_queue = JiraWriteQueue(all_issues_data, journal=journal)
+    fallback = set(oversized_keys)
+    flagged = set(oversized_keys)
+    try:
+        with ThreadPoolExecutor(max_workers=LLM_MAX_IN_FLIGHT) as pool:
+            confirmations = pool.map(lambda c: confirm_cluster(c, all_issues_data), clusters)
+            for cluster_keys, (error_msg, groups, unjudged) in zip(clusters, confirmations):
+                if error_msg:
+                    final_results.append((cluster_keys[0], f"Skipped cluster {', '.join(cluster_keys)} ({error_msg})"))
+                    flagged.update(cluster_keys)
+                    continue
+                for confirmed in groups:
+                    for key in confirmed:
+                        if project_of(key) != PROJECT_KEY:
+                            continue
+                        others_list = [k for k in confirmed if k != key]
+                        dup_payload_str = json.dumps({"fields": {"customfield_10602": duplicate_message(others_list)}})
+                        final_results.append(write_queue.submit(key, dup_payload_str))
+                    flagged.update(confirmed)
+                # Sin veredicto frente a todo el clúster no se puede escribir ✔️: se analizan aparte.
+                fallback.update(unjudged)
+                flagged.update(unjudged)
+
+        no_dup_payload_str = json.dumps({"fields": {"customfield_10602": NO_DUPLICATES_MESSAGE}})
+        for key in sorted(primary_keys(all_issues_data.keys())):
+            if key not in flagged:
+                final_results.append(write_queue.submit(key, no_dup_payload_str))
+    finally:
+        write_queue.close()
+
+    results = collect_results(final_results)
+    fallback_keys = sorted(primary_keys(fallback))
+    if fallback_keys:
+        print(f"\n--- {len(oversized)} cluster(s) larger than {CLUSTER_MAX_SIZE} and unresolved cluster members: analyzing {len(fallback_keys)} issue(s) one by one ---")
+        results += run_analysis(fallback_keys, all_issues_data, vector_store, journal)
+    return results
+
+def load_lexical_index(all_issues_data):
+    global LEXICAL_INDEX
+    if not LEXICAL_PREFILTER:
+        return
+    with metrics.timer("lexical_build"):
+        LEXICAL_INDEX = build_lexical_index(all_issues_data)
+    print(f"Lexical prefilter ready ({len(LEXICAL_INDEX)} issues).")
+
+def align_issue_table(all_issues_data, vector_store):
+    """
+    Reordena la tabla de issues para que el issue con id i sea el vector con id global i.
+    Si algún shard conserva claves que ya no están en la tabla (p. ej. un shard que no se
+    actualizó tras un sync), se actualiza antes para no desplazar las posiciones.
+    """
+    stale = sorted({project_of(k) for k in vector_store.keys() if all_issues_data.id_of(k) is None})
+    if stale:
+        vector_store.update(all_issues_data, projects=stale)
+    all_issues_data.align(vector_store.keys())
+
+def load_vector_index(all_issues_data, projects=None):
+    """
+    Carga los shards de PROJECT_KEYS y aplica los cambios de los de `projects`
+    (por defecto todos). Devuelve (índice, claves nuevas o cambiadas en shards que ya
+    estaban guardados); el índice es None si no queda ningún vector indexado.
+    """
+    vector_store = ShardedIndex(clients.get("embeddings"), PROJECT_KEYS).load()
+    existing = set(vector_store.shards)
+    with metrics.timer("index_build"):
+        embedded = vector_store.update(all_issues_data, projects=projects)
+    # Un shard construido desde cero no aporta cambios: todo su proyecto sería "nuevo".
+    embedded = [key for key in embedded if project_of(key) in existing]
+    if not len(vector_store):
+        print("Error: Could not build vector store.")
+        return None, []
+    align_issue_table(all_issues_data, vector_store)
+    return vector_store, embedded
+
+def initialize(sync=True, full_sync=False, projects=None, require_sync=False, lexical=True):
+    """
+    Sincroniza (opcional), abre la base de datos y prepara la memoria vectorial y el índice léxico
+    (este solo con `lexical`: los comandos que no analizan no lo necesitan).
+    Con `projects` solo se sincronizan y reindexan esos proyectos; el resto de shards se carga tal cual.
+    Si la sincronización falla se sigue con la base de datos local, salvo con `require_sync`.
+    """
+    if sync and not fetch_and_save_issues(full=full_sync, projects=projects):
+        if require_sync:
+            print("Error: Jira sync failed. Cannot proceed (use --no-sync to work from the local database).")
+            return None, None
+        print("Warning: Jira sync failed; continuing with the local database.")
+    all_issues_data = load_issue_store()
+    if not all_issues_data:
+        print("Error: No issues loaded from the local database. Cannot proceed.")
+        return None, None
+    if lexical:
+        load_lexical_index(all_issues_data)
+    vector_store, _embedded = load_vector_index(all_issues_data, projects)
+    return all_issues_data, vector_store
+
+class IssueWatcher:
+    """
+    Modo vigilancia: mantiene abiertas la base de datos y la memoria vectorial,
+    sincroniza de forma incremental cada `interval` segundos (o al recibir un webhook),
+    actualiza el índice en memoria y analiza solo los issues nuevos o con texto cambiado.
+    """
+
+    def __init__(self, all_issues_data, vector_store, pending=(), synced_at=None):
+        self.all_issues_data = all_issues_data
+        self.vector_store = vector_store
+        # Inicio de la última sincronización correcta (time.time()); None = usar la marca de agua.
+        self.synced_at = synced_at
+        self.last_seen = all_issues_data.max_updated()
+        self.last_prune = time.monotonic()
+        self.wake = threading.Event()
+        self.stopping = threading.Event()
+        # Issues embebidos al arrancar (editados con el servicio parado): se analizan en el primer ciclo.
+        self._forced = set(pending)
+        self._lock = threading.Lock()
+
+    def notify(self, keys):
+        """Despierta el bucle; las claves recibidas se analizan aunque su texto no haya cambiado."""
+        with self._lock:
+            self._forced.update(keys)
+        self.wake.set()
+
+    def stop(self):
+        self.stopping.set()
+        self.wake.set()
+
+    def poll_once(self):
+        with self._lock:
+            forced, self._forced = self._forced, set()
+        try:
+            results = self._poll(forced)
+        except Exception:
+            self._requeue(forced)
+            raise
+        if results is None:
+            self._requeue(forced)
+            return []
+        return results
+
+    def _requeue(self, keys):
+        """Devuelve a la cola las claves forzadas de un ciclo fallido para el siguiente."""
+        with self._lock:
+            self._forced |= keys
+
+    def _poll(self, forced):
+        """Un ciclo de vigilancia; devuelve None si la sincronización falla."""
+        prune = time.monotonic() - self.last_prune >= WATCH_PRUNE_INTERVAL
+        # Solo se pide lo cambiado desde el último sondeo correcto (más un margen), no el
+        # margen de SYNC_OVERLAP_MINUTES de un arranque en frío, que descargaría un día entero.
+        started = time.time()
+        since_minutes = None
+        if self.synced_at is not None:
+            since_minutes = math.ceil((started - self.synced_at) / 60 + WATCH_SYNC_MARGIN_MINUTES)
+        if not fetch_and_save_issues(prune=prune, since_minutes=since_minutes):
+            return None
+        self.synced_at = started
+        if prune:
+            self.last_prune = time.monotonic()
+
+        # Las escrituras del propio agente también cambian `updated`, pero no el texto:
+        # el hash de contenido las descarta y no se vuelven a analizar.
+        if self.last_seen:
+            candidates = self.all_issues_data.keys_updated_since(self.last_seen)
+        else:
+            candidates = self.all_issues_data.keys()
+        self.last_seen = self.all_issues_data.max_updated() or self.last_seen
+        self.all_issues_data.refresh(candidates)
+        with metrics.timer("index_update"):
+            embedded = self.vector_store.update(self.all_issues_data, keys=candidates)
+        if not len(self.vector_store):
+            return []
+        align_issue_table(self.all_issues_data, self.vector_store)
+        if LEXICAL_INDEX:
+            LEXICAL_INDEX.retain(self.all_issues_data.keys())
+            for key in embedded:
+                LEXICAL_INDEX.add(key, lexical_text(self.all_issues_data.get(key, {})))
+        keys = sorted(primary_keys(set(embedded) | {k for k in forced if k in self.all_issues_data}))
+        if not keys:
+            return []
+        print(f"\n--- Watch: analyzing {len(keys)} new or changed issue(s) ---")
+        return run_analysis(keys, self.all_issues_data, self.vector_store)
+
+    def run(self, results_stream, interval=None, max_cycles=0):
+        interval = WATCH_INTERVAL if interval is None else interval
+        cycles = 0
+        while not self.stopping.is_set():
+            try:
+                results = self.poll_once()
+            except Exception as e:
+                print(f"Watch cycle failed ({e}); retrying in {interval:.0f}s.")
+                results = []
+            if results:
+                write_results_jsonl(results, results_stream)
+                metrics.emit_run_report("watch")
+            # Cada informe cubre un ciclo: las muestras no se acumulan mientras el servicio vive.
+            metrics.reset()
+            cycles += 1
+            if max_cycles and cycles >= max_cycles:
+                break
+            self.wake.wait(interval)
+            self.wake.clear()
+
+def start_watcher():
+    """
+    Arranque del modo vigilancia: sincroniza, abre la base de datos y carga los shards del índice.
+    Los issues nuevos o con texto cambiado desde el último índice guardado quedan pendientes
+    de análisis; los shards construidos desde cero no se analizan enteros (para eso está
+    `analyze --all`).
+    """
+    started = time.time()
+    synced_at = started if fetch_and_save_issues() else None
+    if synced_at is None:
+        print("Warning: Initial sync failed; starting from the local database.")
+    all_issues_data = load_issue_store()
+    if not all_issues_data:
+        print("Error: No issues loaded from the local database. Cannot proceed.")
+        return None
+    load_lexical_index(all_issues_data)
+    vector_store, pending = load_vector_index(all_issues_data)
+    if not vector_store:
+        return None
+    if pending:
+        print(f"{len(pending)} issue(s) changed while the watcher was stopped; analyzing them in the first cycle.")
+    return IssueWatcher(all_issues_data, vector_store, pending, synced_at)
+
+def main():
+    """Función principal que inicializa y ejecuta el bucle del agente."""
+    print("--- Jira Autonomous Agent Initializing ---")
+    all_issues_data, vector_store = initialize()
+    if not vector_store:
+        return
+    print("\nInitialization complete. Agent is ready.")
+    while True:
+        user_input = input("\n> Which UCM-X (example: UCM-7) issues would you like to process? (If you dont especify UCM, all will be processed):")
+        if user_input.lower() in ['exit', 'quit', 'salir']:
+            break
         
-        summary = f"✅ PROCESO COMPLETADO\n\nDetalles:\n- " + "\n- ".join(final_results)
-        print(summary)
+        if user_input.strip().lower() == 'cluster':
+            final_results = run_cluster_analysis(all_issues_data, vector_store)
+        else:
+            keys_to_process_sorted = extract_all_issue_keys(user_input, primary_keys(all_issues_data.keys()))
+            print(f"\n--- 1. Targetting {len(keys_to_process_sorted)} issue(s) for processing ---")
+            final_results = run_analysis(keys_to_process_sorted, all_issues_data, vector_store)
+
+        print(format_summary(final_results))
+        metrics.emit_run_report("interactive")
+        metrics.reset()
+
+EXIT_OK = 0
+EXIT_FAILURES = 1
+EXIT_USAGE = 2
+EXIT_INIT_ERROR = 3
+
+def project_list(text) -> list[str]:
+    """Lista de proyectos separada por comas; solo se admiten los de PROJECT_KEYS."""
+    projects = [p.strip().upper() for p in text.split(",") if p.strip()]
+    unknown = [p for p in projects if p not in PROJECT_KEYS]
+    if unknown or not projects:
+        raise argparse.ArgumentTypeError(f"unknown project(s) {', '.join(unknown) or text!r} (PROJECT_KEYS: {', '.join(PROJECT_KEYS)})")
+    return projects
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(
+        prog="JIRAX.py",
+        description="Detección de duplicados en Jira. Sin subcomando se abre el modo interactivo.",
+    )
+    subparsers = parser.add_subparsers(dest="command")
+
+    sync_parser = subparsers.add_parser("sync", help="Sincroniza Jira con la base de datos local.")
+    sync_parser.add_argument("--full", action="store_true", help="Descarga completa en lugar de incremental.")
+    sync_parser.add_argument("--projects", type=project_list, help="Proyectos a sincronizar (p. ej. UCM,ABC; por defecto todos).")
+
+    index_parser = subparsers.add_parser("index", help="Actualiza la memoria vectorial persistente.")
+    index_parser.add_argument("--report", action="store_true", help="Muestra recall/latencia frente a búsqueda exacta.")
+    index_parser.add_argument("--projects", type=project_list, help="Shards a actualizar (por defecto todos).")
+
+    analyze_parser = subparsers.add_parser("analyze", help="Analiza issues y escribe el resultado en Jira.")
+    analyze_parser.add_argument("keys", nargs="*", help="Claves a analizar (p. ej. UCM-7).")
+    analyze_parser.add_argument("--keys-file", help="Fichero con claves ('-' = stdin).")
+    analyze_parser.add_argument("--updated-since", help="Issues con updated >= fecha ISO (p. ej. 2024-05-01).")
+    analyze_parser.add_argument("--all", action="store_true", help="Analiza todas las issues del proyecto principal (PROJECT_KEY).")
+    analyze_parser.add_argument("--cluster", action="store_true", help="Modo por lotes: clustering global del corpus.")
+    analyze_parser.add_argument("--no-sync", action="store_true", help="No sincroniza con Jira antes de analizar.")
+    analyze_parser.add_argument("--output", default="-", help="Fichero JSON-lines de resultados ('-' = stdout).")
+    analyze_parser.add_argument(
+        "--search-projects", type=project_list,
+        help="Proyectos en los que buscar duplicados (por defecto SEARCH_PROJECTS o todos).",
+    )
+    analyze_parser.add_argument(
+        "--resume", nargs="?", const="latest", metavar="RUN_ID",
+        help="Reanuda una ejecución (la última si no se indica): omite lo ya escrito y reintenta el resto.",
+    )
+
+    watch_parser = subparsers.add_parser("watch", help="Servicio: analiza los issues a medida que cambian.")
+    watch_parser.add_argument("--interval", type=float, default=WATCH_INTERVAL, help="Segundos entre sondeos a Jira.")
+    watch_parser.add_argument(
+        "--webhook-port", type=int, default=WATCH_WEBHOOK_PORT,
+        help="Puerto local para webhooks POST de Jira (0 = sin webhook).",
+    )
+    watch_parser.add_argument("--max-cycles", type=int, default=0, help="Termina tras N ciclos (0 = sin límite).")
+    watch_parser.add_argument("--output", default="-", help="Fichero JSON-lines de resultados ('-' = stdout).")
+    return parser
+
+def select_keys(args, all_issues_data) -> list[str]:
+    """Reúne las claves pedidas por argumentos, fichero/stdin y filtro de fecha."""
+    selected = set()
+    for text in args.keys:
+        selected.update(re.findall(ISSUE_KEY_PATTERN, text.upper()))
+    if args.keys_file:
+        if args.keys_file == "-":
+            text = sys.stdin.read()
+        else:
+            with open(args.keys_file, "r", encoding="utf-8") as f:
+                text = f.read()
+        selected.update(re.findall(ISSUE_KEY_PATTERN, text.upper()))
+    if args.updated_since:
+        selected.update(all_issues_data.keys_updated_since(args.updated_since))
+    if args.all:
+        selected.update(all_issues_data.keys())
+    ignored = selected - set(primary_keys(selected))
+    if ignored:
+        print(f"Ignoring {len(ignored)} issue(s) outside {PROJECT_KEY} (reference projects are not analyzed).")
+    return sorted(primary_keys(selected))
+
+def write_results_jsonl(results, stream):
+    for result in results:
+        stream.write(json.dumps(result, ensure_ascii=False) + "\n")
+    stream.flush()
+
+def run_analyze_command(args, results_stream) -> int:
+    global SEARCH_PROJECTS
+    if args.search_projects:
+        SEARCH_PROJECTS = args.search_projects
+    journal = RunJournal()
+    resumed_keys = None
+    if args.resume:
+        if args.resume != "latest" and not args.resume.isdigit():
+            print(f"Error: Invalid run id '{args.resume}'.")
+            return EXIT_USAGE
+        resumed = journal.resume(None if args.resume == "latest" else int(args.resume))
+        if resumed is None:
+            print("Error: No run to resume.")
+            return EXIT_USAGE
+        command, resumed_keys = resumed
+        args.cluster = command == "cluster"
+        print(f"Resuming run {journal.run_id} ({command}).")
+    elif not (args.cluster or args.keys or args.keys_file or args.updated_since or args.all):
+        print("Error: No issues selected (use keys, --keys-file, --updated-since, --all or --cluster).")
+        return EXIT_USAGE
+    all_issues_data, vector_store = initialize(sync=not args.no_sync, require_sync=True)
+    if not vector_store:
+        return EXIT_INIT_ERROR
+    if args.cluster:
+        if resumed_keys is None:
+            journal.start("cluster", [])
+            print(f"Run {journal.run_id} started (resume with --resume {journal.run_id}).")
+        results = run_cluster_analysis(all_issues_data, vector_store, journal)
+    else:
+        keys_to_process_sorted = resumed_keys if resumed_keys is not None else select_keys(args, all_issues_data)
+        if resumed_keys is None:
+            journal.start("analyze", keys_to_process_sorted)
+            print(f"Run {journal.run_id} started (resume with --resume {journal.run_id}).")
+        print(f"\n--- 1. Targetting {len(keys_to_process_sorted)} issue(s) for processing ---")
+        results = run_analysis(keys_to_process_sorted, all_issues_data, vector_store, journal)
+    journal.finish()
+    write_results_jsonl(results, results_stream)
+    return EXIT_FAILURES if any(r["status"] == "error" for r in results) else EXIT_OK
+
+def run_watch_command(args, results_stream) -> int:
+    watcher = start_watcher()
+    if watcher is None:
+        return EXIT_INIT_ERROR
+    webhook = WebhookServer(watcher.notify, args.webhook_port).start() if args.webhook_port else None
+    signal.signal(signal.SIGTERM, lambda _signum, _frame: watcher.stop())
+    print(f"\nWatching Jira every {args.interval:.0f}s. Press Ctrl+C to stop.")
+    try:
+        watcher.run(results_stream, args.interval, args.max_cycles)
+    except KeyboardInterrupt:
+        print("\nStopping watch mode.")
+    finally:
+        if webhook:
+            webhook.stop()
+    return EXIT_OK
+
+def run_command(args) -> int:
+    if args.command == "sync":
+        return EXIT_OK if fetch_and_save_issues(full=args.full, projects=args.projects) else EXIT_INIT_ERROR
+    if args.command == "index":
+        all_issues_data, vector_store = initialize(sync=False, projects=args.projects, lexical=False)
+        if not vector_store:
+            return EXIT_INIT_ERROR
+        if args.report:
+            for project in args.projects or PROJECT_KEYS:
+                if project in vector_store.shards:
+                    print(f"\nShard {project}:")
+                    recall_report(vector_store.shards[project])
+        return EXIT_OK
+
+    run = run_watch_command if args.command == "watch" else run_analyze_command
+    # Con resultados por stdout, los mensajes de progreso van a stderr.
+    if args.output == "-":
+        with contextlib.redirect_stdout(sys.stderr):
+            return run(args, sys.__stdout__)
+    with open(args.output, "w", encoding="utf-8") as results_stream:
+        return run(args, results_stream)
+
+def cli(argv=None) -> int:
+    """Punto de entrada de línea de comandos. Devuelve el código de salida."""
+    args = build_arg_parser().parse_args(argv)
+    if args.command is None:
+        main()
+        return EXIT_OK
+    try:
+        return run_command(args)
+    finally:
+        # Con resultados por stdout, el informe va a stderr como el resto del progreso.
+        with contextlib.redirect_stdout(sys.stderr if getattr(args, "output", None) == "-" else sys.stdout):
+            metrics.emit_run_report(args.command)
 
 if __name__ == "__main__":
-    main()
+    sys.exit(cli())
@@ -0,0 +1,82 @@
+import random
+
+# Vocabulario sintético: cada tema tiene sus propias palabras para que los issues
+# de temas distintos queden lejos en el espacio de embeddings.
+TOPICS = 200
+WORDS_PER_TOPIC = 40
+COMMON_WORDS = [f"w{i}" for i in range(300)]
+TEMPLATE_PASSAGE = "Objetivo del caso de uso: mejorar el proceso actual. Impacto esperado en el negocio."
+
+
+def topic_words(topic):
+    return [f"t{topic}x{i}" for i in range(WORDS_PER_TOPIC)]
+
+
+def adf(text):
+    """Descripción en Atlassian Document Format (un párrafo por frase)."""
+    return {
+        "type": "doc",
+        "version": 1,
+        "content": [
+            {"type": "paragraph", "content": [{"type": "text", "text": sentence}]}
+            for sentence in text.split("\n") if sentence
+        ],
+    }
+
+
+def mutate(words, rng, rate):
+    """Paráfrasis: sustituye una fracción de las palabras por otras comunes."""
+    return [rng.choice(COMMON_WORDS) if rng.random() < rate else w for w in words]
+
+
+def make_issue(key, summary_words, description_words, updated):
+    description = " ".join(description_words[:20]) + ".\n" + " ".join(description_words[20:]) + ".\n" + TEMPLATE_PASSAGE
+    return {
+        "key": key,
+        "fields": {
+            "summary": " ".join(summary_words),
+            "assignee": None,
+            "status": {"name": "Backlog"},
+            "created": updated,
+            "updated": updated,
+            "customfield_10190": {"value": "Business"},
+            "customfield_10191": {"value": "Area"},
+            "customfield_10192": {"displayName": "Owner"},
+            "customfield_10193": adf(description),
+            "customfield_10602": None,
+        },
+    }
+
+
+def generate_corpus(n, project_key="UCM", duplicate_rate=0.05, verbatim_rate=0.5, seed=0):
+    """
+    Genera `n` issues con forma de respuesta de /search/jql y grupos de duplicados
+    plantados (copias de un issue base, de 2 a 3 miembros: una fracción `verbatim_rate`
+    casi literales y el resto paráfrasis con un 10 % de palabras cambiadas). Devuelve
+    (issues, grupos) donde cada grupo es una lista de claves.
+    """
+    rng = random.Random(seed)
+    issues, groups = [], []
+    number = 1
+    updated = "2024-01-01T00:00:00.000+0000"
+    while len(issues) < n:
+        topic = rng.randrange(TOPICS)
+        vocabulary = topic_words(topic) + COMMON_WORDS[:20]
+        summary = rng.sample(vocabulary, 6)
+        description = [rng.choice(vocabulary) for _ in range(40)]
+        members = 1
+        if rng.random() < duplicate_rate and n - len(issues) >= 2:
+            members = rng.choice((2, 3)) if n - len(issues) >= 3 else 2
+        group = []
+        for copy in range(members):
+            key = f"{project_key}-{number}"
+            number += 1
+            if copy == 0:
+                issues.append(make_issue(key, summary, description, updated))
+            else:
+                rate = 0.01 if rng.random() < verbatim_rate else 0.1
+                issues.append(make_issue(key, mutate(summary, rng, rate), mutate(description, rng, rate), updated))
+            group.append(key)
+        if members > 1:
+            groups.append(group)
+    return issues, groups
@@ -0,0 +1,216 @@
+import argparse
+import json
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from benchmarks.corpus import generate_corpus
+
+PROJECT_RE = re.compile(r"project\s*=\s*([A-Z][A-Z0-9_]+)")
+UPDATED_SINCE_RE = re.compile(r'updated >= "(\d{4}/\d{2}/\d{2} \d{2}:\d{2})"')
+UPDATED_RELATIVE_RE = re.compile(r'updated >= "-(\d+)m"')
+ISSUE_PATH_RE = re.compile(r"^/rest/api/3/issue/([A-Z][A-Z0-9_]+-\d+)$")
+BULK_EDIT_PATH = "/rest/api/3/bulk/issues/fields"
+BULK_TASK_PATH_RE = re.compile(r"^/rest/api/3/bulk/queue/(\d+)$")
+BULK_TEXT_FIELD_TYPES = ("singleLineTextFields", "multilineTextFields")
+
+
+def parse_updated(value):
+    return datetime.strptime(value, "%Y-%m-%dT%H:%M:%S.%f%z")
+
+
+class FakeJira:
+    """
+    Servidor HTTP local con lo que usa el agente de la API de Jira:
+    GET /rest/api/3/search/jql (paginado con nextPageToken, filtra `project=` y `updated >=`, absoluto o relativo `"-Nm"`), PUT /rest/api/3/issue/{key}
+    y la edición masiva (POST /rest/api/3/bulk/issues/fields + GET /rest/api/3/bulk/queue/{id}).
+    Las escrituras se aplican al corpus en memoria y quedan en `writes` (una entrada por
+    issue, también en las masivas, que además se guardan en `bulk_edits`). Con
+    `bulk=False` la edición masiva responde 404, como un Jira que no la ofrece;
+    `bulk_polls` es cuántas consultas devuelven RUNNING antes de COMPLETE.
+    """
+
+    def __init__(self, issues, host="127.0.0.1", port=0, latency=0.0, bulk=True, bulk_polls=1):
+        self.issues = {issue["key"]: issue for issue in issues}
+        self.ids = {key: str(10000 + i) for i, key in enumerate(self.issues)}
+        self.latency = latency
+        self.bulk = bulk
+        self.bulk_polls = bulk_polls
+        self.writes = []
+        self.bulk_edits = []
+        self.tasks = {}
+        self.requests = 0
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def search(self, query):
+        jql = query.get("jql", [""])[0]
+        max_results = int(query.get("maxResults", ["50"])[0])
+        fields = query.get("fields", [""])[0]
+        start = int(query.get("nextPageToken", ["0"])[0])
+        with self._lock:
+            issues = list(self.issues.values())
+        project = PROJECT_RE.search(jql)
+        if project:
+            issues = [i for i in issues if i["key"].rsplit("-", 1)[0] == project.group(1)]
+        match = UPDATED_SINCE_RE.search(jql)
+        if match:
+            since = datetime.strptime(match.group(1), "%Y/%m/%d %H:%M").replace(tzinfo=timezone.utc)
+            issues = [i for i in issues if parse_updated(i["fields"]["updated"]) >= since]
+        match = UPDATED_RELATIVE_RE.search(jql)
+        if match:
+            since = datetime.now(timezone.utc) - timedelta(minutes=int(match.group(1)))
+            issues = [i for i in issues if parse_updated(i["fields"]["updated"]) >= since]
+        page = issues[start:start + max_results]
+        if fields == "key":
+            page = [{"key": issue["key"]} for issue in page]
+        body = {"issues": page}
+        if start + max_results < len(issues):
+            body["nextPageToken"] = str(start + max_results)
+        return body
+
+    def update(self, key, fields):
+        with self._lock:
+            issue = self.issues.get(key)
+            if issue is None:
+                return False
+            issue["fields"].update(fields)
+            issue["fields"]["updated"] = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000%z")
+            self.writes.append((key, fields))
+            return True
+
+    def bulk_edit(self, payload):
+        """Aplica una edición masiva de campos de texto y devuelve el id de la tarea (None si no es válida)."""
+        keys = payload.get("selectedIssueIdsOrKeys") or []
+        edited = payload.get("editedFieldsInput") or {}
+        fields = {}
+        for field_type in BULK_TEXT_FIELD_TYPES:
+            for field in edited.get(field_type) or []:
+                fields[field["fieldId"]] = field["text"]
+        if not keys or not fields or set(fields) != set(payload.get("selectedActions") or []):
+            return None
+        processed, invalid = [], 0
+        for key in keys:
+            if self.update(key, dict(fields)):
+                processed.append(self.ids[key])
+            else:
+                invalid += 1
+        with self._lock:
+            task_id = str(len(self.tasks) + 1)
+            self.bulk_edits.append((list(keys), fields))
+            self.tasks[task_id] = {
+                "taskId": task_id,
+                "status": "COMPLETE",
+                "progressPercent": 100,
+                "processedAccessibleIssues": processed,
+                "failedAccessibleIssues": {},
+                "invalidOrInaccessibleIssueCount": invalid,
+                "totalIssueCount": len(keys),
+                "pendingPolls": self.bulk_polls,
+            }
+        return task_id
+
+    def bulk_task(self, task_id):
+        with self._lock:
+            task = self.tasks.get(task_id)
+            if task is None:
+                return None
+            if task["pendingPolls"] > 0:
+                task["pendingPolls"] -= 1
+                return {"taskId": task_id, "status": "RUNNING", "progressPercent": 50}
+            return {k: v for k, v in task.items() if k != "pendingPolls"}
+
+    def _handler_class(self):
+        jira = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _reply(self, status, body=None):
+                data = json.dumps(body).encode("utf-8") if body is not None else b""
+                self.send_response(status)
+                if body is not None:
+                    self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _begin(self):
+                with jira._lock:
+                    jira.requests += 1
+                if jira.latency:
+                    time.sleep(jira.latency)
+                return urlparse(self.path)
+
+            def _body(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                return json.loads(self.rfile.read(length) or b"{}")
+
+            def do_GET(self):
+                url = self._begin()
+                task_match = BULK_TASK_PATH_RE.match(url.path)
+                if task_match and jira.bulk:
+                    task = jira.bulk_task(task_match.group(1))
+                    if task is None:
+                        return self._reply(404, {"errorMessages": ["Task not found"]})
+                    return self._reply(200, task)
+                if url.path != "/rest/api/3/search/jql":
+                    return self._reply(404, {"errorMessages": ["Not found"]})
+                self._reply(200, jira.search(parse_qs(url.query)))
+
+            def do_POST(self):
+                url = self._begin()
+                payload = self._body()
+                if url.path != BULK_EDIT_PATH or not jira.bulk:
+                    return self._reply(404, {"errorMessages": ["Not found"]})
+                task_id = jira.bulk_edit(payload)
+                if task_id is None:
+                    return self._reply(400, {"errorMessages": ["Invalid bulk edit request"]})
+                self._reply(201, {"taskId": task_id})
+
+            def do_PUT(self):
+                url = self._begin()
+                match = ISSUE_PATH_RE.match(url.path)
+                payload = self._body()
+                if not match:
+                    return self._reply(404, {"errorMessages": ["Not found"]})
+                if not jira.update(match.group(1), payload.get("fields") or {}):
+                    return self._reply(404, {"errorMessages": ["Issue does not exist"]})
+                self._reply(204)
+
+        return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servidor Jira falso con un corpus sintético.")
+    parser.add_argument("--issues", type=int, default=1000)
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.0, help="Segundos de espera por petición.")
+    parser.add_argument("--no-bulk", action="store_true", help="Sin edición masiva (responde 404).")
+    args = parser.parse_args()
+    issues, groups = generate_corpus(args.issues)
+    jira = FakeJira(issues, port=args.port, latency=args.latency, bulk=not args.no_bulk)
+    print(f"Fake Jira with {len(issues)} issues ({len(groups)} duplicate groups) at {jira.url}")
+    try:
+        jira.server.serve_forever()
+    except KeyboardInterrupt:
+        jira.stop()
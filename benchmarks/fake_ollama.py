@@ -0,0 +1,142 @@
+import argparse
+import json
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from benchmarks.fakes import HashingEmbeddings, group_index, verdict_content
+
+
+class FakeOllama:
+    """
+    Servidor HTTP local con lo que usa langchain_ollama de la API de Ollama:
+    GET /api/tags (comprobación de salud), POST /api/embed y POST /api/chat (con o
+    sin streaming NDJSON). Los embeddings son los de HashingEmbeddings y el chat
+    responde como fake_llm. Como un Ollama real con OLLAMA_NUM_PARALLEL=`parallel`,
+    atiende como mucho `parallel` peticiones a la vez; el resto espera su turno.
+    Con `down = True` responde 503 a todo, también a la comprobación de salud.
+    """
+
+    def __init__(self, groups, host="127.0.0.1", port=0, latency=0.0, tokens_per_second=0.0,
+                 embed_dim=256, embed_latency=0.0, parallel=1):
+        self.group_of = group_index(groups)
+        self.embedder = HashingEmbeddings(embed_dim)
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.embed_latency = embed_latency
+        self.down = False
+        self.chat_calls = 0
+        self.embed_calls = 0
+        self._slots = threading.BoundedSemaphore(parallel)
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def embed(self, body):
+        texts = body.get("input", [])
+        texts = [texts] if isinstance(texts, str) else texts
+        with self._slots:
+            if self.embed_latency:
+                time.sleep(self.embed_latency * len(texts))
+            with self._lock:
+                self.embed_calls += 1
+            return {"model": body.get("model"), "embeddings": [self.embedder.embed_one(t) for t in texts]}
+
+    def chat(self, body):
+        prompt = "\n".join(m.get("content", "") for m in body.get("messages", []))
+        content = verdict_content(self.group_of, prompt)
+        tokens = max(1, len(content) // 4)
+        generation = tokens / self.tokens_per_second if self.tokens_per_second else 0.0
+        with self._slots:
+            if self.latency or generation:
+                time.sleep(self.latency + generation)
+            with self._lock:
+                self.chat_calls += 1
+        created = datetime.now(timezone.utc).isoformat()
+        message = {"model": body.get("model"), "created_at": created, "message": {"role": "assistant", "content": content}, "done": False}
+        final = {
+            "model": body.get("model"), "created_at": created, "message": {"role": "assistant", "content": ""},
+            "done": True, "done_reason": "stop", "prompt_eval_count": len(prompt) // 4,
+            "eval_count": tokens, "eval_duration": int(generation * 1e9),
+        }
+        if not body.get("stream", True):
+            return [dict(message, done=True, eval_count=tokens, eval_duration=int(generation * 1e9))]
+        return [message, final]
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, payload=None, ndjson=None):
+                body = b""
+                if ndjson is not None:
+                    body = "".join(json.dumps(line) + "\n" for line in ndjson).encode("utf-8")
+                elif payload is not None:
+                    body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/x-ndjson" if ndjson is not None else "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if fake.down:
+                    self._send(503, {"error": "unavailable"})
+                elif self.path == "/api/tags":
+                    self._send(200, {"models": []})
+                else:
+                    self._send(404, {"error": "not found"})
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}")
+                if fake.down:
+                    self._send(503, {"error": "unavailable"})
+                elif self.path == "/api/embed":
+                    self._send(200, fake.embed(body))
+                elif self.path == "/api/chat":
+                    lines = fake.chat(body)
+                    if body.get("stream", True):
+                        self._send(200, ndjson=lines)
+                    else:
+                        self._send(200, lines[0])
+                else:
+                    self._send(404, {"error": "not found"})
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor Ollama falso para pruebas locales.")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--latency", type=float, default=0.0, help="Segundos fijos por llamada de chat.")
+    parser.add_argument("--parallel", type=int, default=1, help="Peticiones atendidas a la vez (OLLAMA_NUM_PARALLEL).")
+    args = parser.parse_args()
+    fake = FakeOllama([], port=args.port, latency=args.latency, parallel=args.parallel).start()
+    print(f"Fake Ollama listening on {fake.url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        fake.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import hashlib
+import json
+import re
+import time
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+
+WORD_RE = re.compile(r"\w+", re.UNICODE)
+CURRENT_KEY_RE = re.compile(r"ISSUE EN ANÁLISIS AHORA:\*\* ([A-Z]{2,}-\d+)")
+NEIGHBOR_KEY_RE = re.compile(r"- ISSUE ([A-Z]{2,}-\d+):")
+
+
+def word_bucket(word, dim):
+    digest = hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest()
+    value = int.from_bytes(digest, "little")
+    return value % dim, 1.0 if (value >> 32) & 1 else -1.0
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Embeddings deterministas sin modelo: bolsa de palabras con hashing firmado
+    y normalización L2. Textos con muchas palabras en común quedan cerca.
+    """
+
+    def __init__(self, dim=256, latency=0.0):
+        self.dim = dim
+        self.latency = latency
+
+    def embed_one(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in WORD_RE.findall(text.lower()):
+            bucket, sign = word_bucket(word, self.dim)
+            vector[bucket] += sign
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts):
+        if self.latency:
+            time.sleep(self.latency * len(texts))
+        return [self.embed_one(t) for t in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def group_index(groups):
+    return {key: frozenset(group) for group in groups for key in group}
+
+
+def verdict_content(group_of, prompt_text):
+    """JSON de respuesta: los vecinos del prompt del mismo grupo plantado que el issue actual."""
+    match = CURRENT_KEY_RE.search(prompt_text)
+    current = match.group(1) if match else None
+    neighbors = NEIGHBOR_KEY_RE.findall(prompt_text)
+    duplicates = sorted(k for k in neighbors if k != current and k in group_of.get(current, ()))
+    if duplicates:
+        verdict = f"❗ Issue may be repeated or similar to {', '.join(duplicates)}"
+    else:
+        verdict = "✔️ No duplicates detected"
+    return json.dumps({"customfield_10602": verdict}, ensure_ascii=False)
+
+
+def fake_llm(groups, latency=0.0, output_tokens_per_second=50.0):
+    """
+    LLM determinista: responde con los vecinos del prompt que pertenecen al mismo
+    grupo de duplicados plantado que el issue actual. `latency` simula el tiempo
+    fijo por llamada y `output_tokens_per_second` el de generación.
+    """
+    group_of = group_index(groups)
+
+    def respond(prompt_value):
+        content = verdict_content(group_of, prompt_value.to_string())
+        generation = len(content) / 4 / output_tokens_per_second if output_tokens_per_second else 0.0
+        if latency or generation:
+            time.sleep(latency + generation)
+        return AIMessage(content=content)
+
+    return RunnableLambda(respond)
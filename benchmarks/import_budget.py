@@ -0,0 +1,98 @@
+"""
+Presupuesto de arranque: importa JIRAX en un intérprete limpio y falla (código 1)
+si la importación en frío supera el presupuesto, si carga módulos pesados que
+solo deben importarse en el primer uso (langchain, ollama, faiss...) o si crea
+ficheros (cachés SQLite) en el directorio actual.
+
+    python -m benchmarks.import_budget --budget 0.6 --repeat 5
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Módulos que no deben aparecer en sys.modules tras `import JIRAX`.
+DEFERRED_MODULES = (
+    "langchain_ollama", "langchain_community", "langchain_core", "ollama", "faiss",
+    "pandas", "sentence_transformers", "torch",
+)
+CHILD_CODE = """
+import json, os, sys, time
+sys.path.insert(0, {root!r})
+started = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - started
+loaded = sorted(m for m in {deferred!r} if m in sys.modules)
+created = sorted(os.listdir("."))
+print(json.dumps({{"seconds": seconds, "loaded": loaded, "created": created}}))
+"""
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="JIRAX", help="Módulo de entrada a importar.")
+    parser.add_argument("--budget", type=float, default=float(os.getenv("IMPORT_BUDGET_SECONDS", "0.6")),
+                        help="Segundos máximos de importación en frío (mejor de --repeat).")
+    parser.add_argument("--repeat", type=int, default=5, help="Intérpretes limpios a lanzar.")
+    parser.add_argument("--top", type=int, default=10, help="Módulos más lentos a mostrar si se supera el presupuesto.")
+    return parser
+
+
+def cold_import(module, workdir, importtime=False):
+    """Importa `module` en un subproceso nuevo (con `-X importtime` si se pide)."""
+    command = [sys.executable]
+    if importtime:
+        command += ["-X", "importtime"]
+    command += ["-c", CHILD_CODE.format(root=REPO_ROOT, module=module, deferred=DEFERRED_MODULES)]
+    # cwd temporal: si importar JIRAX creara cachés SQLite en el directorio actual, irían aquí.
+    completed = subprocess.run(command, cwd=workdir, capture_output=True, text=True, check=True)
+    return json.loads(completed.stdout.strip().splitlines()[-1]), completed.stderr
+
+
+def slowest_imports(importtime_output, top):
+    """Módulos con mayor tiempo acumulado según la salida de `-X importtime`."""
+    rows = []
+    for line in importtime_output.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative_us), name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    with tempfile.TemporaryDirectory(prefix="jirax_import_") as workdir:
+        runs = []
+        for _ in range(max(1, args.repeat)):
+            # Cada importación parte de un directorio vacío para detectar los ficheros que crea.
+            for name in os.listdir(workdir):
+                os.remove(os.path.join(workdir, name))
+            runs.append(cold_import(args.module, workdir)[0])
+        best = min(run["seconds"] for run in runs)
+        loaded = sorted({m for run in runs for m in run["loaded"]})
+        print(f"import {args.module}: best {best:.3f}s over {len(runs)} run(s) (budget {args.budget:.3f}s)")
+        failed = False
+        if loaded:
+            print(f"FAIL: heavy modules imported eagerly: {', '.join(loaded)}")
+            failed = True
+        created = sorted({name for run in runs for name in run["created"]})
+        if created:
+            print(f"FAIL: import creates files in the working directory: {', '.join(created)}")
+            failed = True
+        if best > args.budget:
+            print(f"FAIL: cold import exceeds the budget by {best - args.budget:.3f}s")
+            failed = True
+        if failed:
+            _result, importtime_output = cold_import(args.module, workdir, importtime=True)
+            print("Slowest imports (cumulative):")
+            for cumulative_us, name in slowest_imports(importtime_output, args.top):
+                print(f"  {cumulative_us / 1e6:8.3f}s  {name}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,270 @@
+"""
+Benchmark reproducible del pipeline de JIRAX sin servicios externos: Jira falso en
+local, embeddings por hashing y LLM determinista que conoce los duplicados plantados.
+
+    python -m benchmarks.run_benchmark --sizes 1000,10000,100000 --output bench.json
+
+Cada tamaño se ejecuta en un subproceso limpio (módulos, cachés y RSS propios). El
+corpus y los servidores falsos viven en otro proceso hijo, así que el RSS medido es
+solo el del agente.
+"""
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DUPLICATE_PREFIX = "❗"
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000,100000", help="Tamaños de corpus separados por comas.")
+    parser.add_argument("--analyze-limit", type=int, default=1000, help="Issues analizados por tamaño (0 = todos).")
+    parser.add_argument("--duplicate-rate", type=float, default=0.05)
+    parser.add_argument("--verbatim-rate", type=float, default=0.5, help="Fracción de copias casi literales.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--page-size", type=int, default=100, help="maxResults de cada página de /search/jql.")
+    parser.add_argument("--jira-latency", type=float, default=0.0, help="Segundos de espera por petición a Jira.")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Segundos fijos por llamada al LLM.")
+    parser.add_argument("--llm-tokens-per-second", type=float, default=0.0, help="0 = generación instantánea.")
+    parser.add_argument("--embed-latency", type=float, default=0.0, help="Segundos por texto embebido.")
+    parser.add_argument("--embed-dim", type=int, default=256)
+    parser.add_argument("--no-bulk", action="store_true", help="Jira falso sin edición masiva (solo PUT por issue).")
+    parser.add_argument(
+        "--ollama-backends", type=int, default=0,
+        help="N servidores Ollama falsos detrás del pool de clientes reales (0 = LLM y embeddings en proceso).",
+    )
+    parser.add_argument("--ollama-parallel", type=int, default=1, help="Peticiones simultáneas por servidor Ollama falso.")
+    parser.add_argument("--output", help="Fichero JSON con los resultados.")
+    parser.add_argument("--keep", action="store_true", help="Conserva el directorio de trabajo de cada tamaño.")
+    parser.add_argument("--verbose", action="store_true", help="Muestra la salida del agente.")
+    parser.add_argument("--single", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--result-file", help=argparse.SUPPRESS)
+    return parser
+
+
+def peak_rss_mb():
+    # ru_maxrss está en KiB en Linux y en bytes en macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def detection_quality(writes, analyzed_keys, groups):
+    """Recall y precisión de los ❗ escritos en Jira frente a los duplicados plantados."""
+    planted = {key for group in groups for key in group}
+    flagged = {key for key, fields in writes if str(fields.get("customfield_10602", "")).startswith(DUPLICATE_PREFIX)}
+    expected = planted & set(analyzed_keys)
+    return {
+        "planted_in_sample": len(expected),
+        "flagged": len(flagged),
+        "recall": len(flagged & expected) / len(expected) if expected else None,
+        "precision": len(flagged & planted) / len(flagged) if flagged else None,
+    }
+
+
+def serve_fakes(conn, size, args):
+    """
+    Proceso hijo: genera el corpus y sirve el Jira y los Ollama falsos. Envía sus URLs y
+    los grupos plantados; al recibir la orden de parar devuelve los contadores.
+    """
+    from benchmarks.corpus import generate_corpus
+    from benchmarks.fake_jira import FakeJira
+    from benchmarks.fake_ollama import FakeOllama
+
+    issues, groups = generate_corpus(
+        size, duplicate_rate=args.duplicate_rate, verbatim_rate=args.verbatim_rate, seed=args.seed
+    )
+    jira = FakeJira(issues, latency=args.jira_latency, bulk=not args.no_bulk).start()
+    backends = [
+        FakeOllama(
+            groups, latency=args.llm_latency, tokens_per_second=args.llm_tokens_per_second,
+            embed_dim=args.embed_dim, embed_latency=args.embed_latency, parallel=args.ollama_parallel,
+        ).start()
+        for _ in range(args.ollama_backends)
+    ]
+    del issues
+    conn.send({"groups": groups, "jira_url": jira.url, "ollama_urls": [backend.url for backend in backends]})
+    conn.recv()
+    conn.send({
+        "jira_requests": jira.requests,
+        "jira_writes": jira.writes,
+        "jira_bulk_edits": len(jira.bulk_edits),
+        "ollama_chat_calls": [backend.chat_calls for backend in backends],
+        "ollama_embed_calls": [backend.embed_calls for backend in backends],
+    })
+    jira.stop()
+    for backend in backends:
+        backend.stop()
+
+
+def start_fakes(size, args):
+    conn, child_conn = multiprocessing.Pipe()
+    process = multiprocessing.get_context("spawn").Process(target=serve_fakes, args=(child_conn, size, args), daemon=True)
+    process.start()
+    return process, conn, conn.recv()
+
+
+def stop_fakes(process, conn):
+    conn.send("stop")
+    counters = conn.recv()
+    process.join()
+    return counters
+
+
+def run_single(size, args):
+    from benchmarks.fakes import HashingEmbeddings, fake_llm
+
+    workdir = tempfile.mkdtemp(prefix=f"jirax_bench_{size}_")
+    fakes, conn, served = start_fakes(size, args)
+    groups = served["groups"]
+    if served["ollama_urls"]:
+        # Concurrencia suficiente para mantener ocupados todos los servidores.
+        slots = str(len(served["ollama_urls"]) * args.ollama_parallel)
+        os.environ["OLLAMA_HOSTS"] = ",".join(served["ollama_urls"])
+        os.environ.setdefault("LLM_MAX_IN_FLIGHT", slots)
+        os.environ.setdefault("EMBED_WORKERS", slots)
+    os.environ.update({
+        "JIRA_BASE_URL": served["jira_url"],
+        "JIRA_DOMAIN": "fake-jira.local",
+        "EMAIL": "bench@example.com",
+        "API_TOKEN": "bench",
+        "PROJECT_KEY": "UCM",
+        "MAX_RESULTS": str(args.page_size),
+        "OUTPUT_DB": os.path.join(workdir, "ucm_issues.db"),
+        "OUTPUT_CSV": os.path.join(workdir, "ucm_issues.csv"),
+        "INDEX_DIR": os.path.join(workdir, "ucm_faiss_index"),
+        "EMBEDDING_CACHE_DB": os.path.join(workdir, "jirax_cache.db"),
+        "VERDICT_CACHE_DB": os.path.join(workdir, "jirax_cache.db"),
+        "RUN_JOURNAL_DB": os.path.join(workdir, "jirax_runs.db"),
+        "JIRA_WRITE_ALLOWLIST": "*",
+        "JIRA_RATE_LIMIT": "0",
+        "JIRA_BULK_POLL_INTERVAL": "0.05",
+        "EXPORT_CSV": "false",
+        "FULL_SYNC": "false",
+    })
+    os.chdir(workdir)
+    sys.path.insert(0, REPO_ROOT)
+
+    try:
+        started = time.perf_counter()
+        import JIRAX
+        import clients
+        import metrics
+        import_seconds = time.perf_counter() - started
+        from embedding_cache import CachedEmbeddings
+
+        if not served["ollama_urls"]:
+            clients.set_instance("llm", fake_llm(groups, args.llm_latency, args.llm_tokens_per_second))
+            clients.set_instance("embeddings", CachedEmbeddings(HashingEmbeddings(args.embed_dim, args.embed_latency), "hashing"))
+        metrics.reset()
+
+        started = time.perf_counter()
+        all_issues_data, vector_store = JIRAX.initialize(sync=True)
+        initialize_seconds = time.perf_counter() - started
+        if not vector_store:
+            raise RuntimeError("initialize() did not return a vector store")
+
+        keys = sorted(all_issues_data.keys())
+        if args.analyze_limit and args.analyze_limit < len(keys):
+            keys = sorted(random.Random(args.seed).sample(keys, args.analyze_limit))
+        started = time.perf_counter()
+        results = JIRAX.run_analysis(keys, all_issues_data, vector_store)
+        analysis_seconds = time.perf_counter() - started
+        run_report = metrics.report()
+    finally:
+        counters = stop_fakes(fakes, conn)
+        os.chdir(REPO_ROOT)
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    summaries = run_report["summaries"]
+    per_issue = summaries.get("analyze_issue_seconds", {})
+    return {
+        "size": size,
+        "duplicate_groups": len(groups),
+        "import_seconds": import_seconds,
+        "startup_seconds": import_seconds + initialize_seconds,
+        "sync_pages": summaries.get("fetch_page_seconds", {}).get("count", 0),
+        "sync_seconds": summaries.get("fetch_page_seconds", {}).get("sum", 0.0),
+        "index_build_seconds": summaries.get("index_build_seconds", {}).get("sum", 0.0),
+        "analyzed": len(keys),
+        "results": len(results),
+        "analysis_seconds": analysis_seconds,
+        "throughput_issues_per_second": len(results) / analysis_seconds if analysis_seconds else None,
+        "per_issue_p50_seconds": per_issue.get("p50"),
+        "per_issue_p95_seconds": per_issue.get("p95"),
+        "llm_calls": summaries.get("llm_call_seconds", {}).get("count", 0),
+        "lexical_gate": run_report["counters"].get("lexical_gate", 0),
+        "jira_requests": counters["jira_requests"],
+        "jira_writes": len(counters["jira_writes"]),
+        "jira_bulk_edits": counters["jira_bulk_edits"],
+        "ollama_chat_calls": counters["ollama_chat_calls"],
+        "ollama_embed_calls": counters["ollama_embed_calls"],
+        "detection": detection_quality(counters["jira_writes"], keys, groups),
+        "peak_rss_mb": peak_rss_mb(),
+        "workdir": workdir if args.keep else None,
+    }
+
+
+def run_in_subprocess(size, argv):
+    fd, result_file = tempfile.mkstemp(prefix="jirax_bench_", suffix=".json")
+    os.close(fd)
+    try:
+        command = [sys.executable, "-m", "benchmarks.run_benchmark", *argv, "--single", str(size), "--result-file", result_file]
+        completed = subprocess.run(command, cwd=REPO_ROOT)
+        if completed.returncode != 0:
+            return {"size": size, "error": f"exit code {completed.returncode}"}
+        with open(result_file, "r", encoding="utf-8") as f:
+            return json.load(f)
+    finally:
+        os.remove(result_file)
+
+
+def print_table(rows):
+    columns = [
+        ("size", "{:>8}"), ("startup_seconds", "{:>10.2f}"), ("index_build_seconds", "{:>10.2f}"),
+        ("per_issue_p50_seconds", "{:>10.4f}"), ("per_issue_p95_seconds", "{:>10.4f}"),
+        ("throughput_issues_per_second", "{:>10.1f}"), ("peak_rss_mb", "{:>10.1f}"),
+    ]
+    headers = ["size", "startup_s", "index_s", "p50_s", "p95_s", "issues/s", "rss_mb"]
+    print("".join(f"{h:>10}" if i else f"{h:>8}" for i, h in enumerate(headers)))
+    for row in rows:
+        if "error" in row:
+            print(f"{row['size']:>8}  error: {row['error']}")
+            continue
+        print("".join(fmt.format(row[name]) if row[name] is not None else f"{'-':>10}" for name, fmt in columns))
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    args = build_arg_parser().parse_args(argv)
+    if args.single:
+        with contextlib.redirect_stdout(sys.stderr if args.verbose else open(os.devnull, "w")):
+            result = run_single(args.single, args)
+        with open(args.result_file, "w", encoding="utf-8") as f:
+            json.dump(result, f)
+        return 0
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    rows = []
+    for size in sizes:
+        print(f"Benchmarking {size} issues...", file=sys.stderr)
+        rows.append(run_in_subprocess(size, argv))
+    print_table(rows)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
+    return 1 if any("error" in row for row in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
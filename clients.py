@@ -0,0 +1,82 @@
+import os
+import threading
+from dotenv import load_dotenv
+import metrics
+
+load_dotenv()
+LLM_MODEL = os.getenv("LLM_MODEL", "jirax-pro:latest")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "mxbai-embed-large:latest")
+
+# Registro de objetos caros de construir (clientes de Ollama, plantillas de LangChain).
+# Cada uno se crea la primera vez que se pide con get(); importar este módulo no
+# carga langchain ni ollama, así que `--help` o un `sync` arrancan al momento.
+# Con varios servidores Ollama configurados, el LLM y los embeddings se reparten con ollama_pool.
+_factories = {}
+_instances = {}
+_lock = threading.Lock()
+
+
+def register(name, factory):
+    """Registra (o sustituye) la factoría de `name`; la instancia anterior se descarta."""
+    with _lock:
+        _factories[name] = factory
+        _instances.pop(name, None)
+
+
+def set_instance(name, instance):
+    """Fija la instancia de `name` sin pasar por la factoría (benchmarks, dobles de prueba)."""
+    with _lock:
+        _instances[name] = instance
+
+
+def get(name):
+    """Devuelve la instancia de `name`, construyéndola en el primer uso."""
+    instance = _instances.get(name)
+    if instance is not None:
+        return instance
+    with _lock:
+        instance = _instances.get(name)
+        if instance is None:
+            if name not in _factories:
+                raise KeyError(f"No client registered under '{name}'")
+            with metrics.timer("client_init", client=name):
+                instance = _instances[name] = _factories[name]()
+        return instance
+
+
+def reset(name=None):
+    """Olvida la instancia de `name` (o todas) para que se vuelva a construir."""
+    with _lock:
+        if name is None:
+            _instances.clear()
+        else:
+            _instances.pop(name, None)
+
+
+def chat_llm():
+    from langchain_ollama import ChatOllama
+    from ollama_pool import OLLAMA_CHAT_HOSTS, BackendPool, pooled_chat
+    if len(OLLAMA_CHAT_HOSTS) < 2:
+        return ChatOllama(model=LLM_MODEL, temperature=0, format="json", base_url=next(iter(OLLAMA_CHAT_HOSTS), None))
+    pool = BackendPool(
+        "chat", OLLAMA_CHAT_HOSTS, lambda url: ChatOllama(model=LLM_MODEL, temperature=0, format="json", base_url=url)
+    )
+    return pooled_chat(pool)
+
+
+def embeddings():
+    from langchain_ollama import OllamaEmbeddings
+    from embedding_cache import CachedEmbeddings
+    from ollama_pool import OLLAMA_EMBED_HOSTS, BackendPool, PooledEmbeddings
+    if len(OLLAMA_EMBED_HOSTS) < 2:
+        client = OllamaEmbeddings(model=EMBEDDING_MODEL, base_url=next(iter(OLLAMA_EMBED_HOSTS), None))
+    else:
+        client = PooledEmbeddings(BackendPool(
+            "embed", OLLAMA_EMBED_HOSTS, lambda url: OllamaEmbeddings(model=EMBEDDING_MODEL, base_url=url)
+        ))
+    # La caché va por delante del pool: solo los textos nuevos llegan a los servidores.
+    return CachedEmbeddings(client, EMBEDDING_MODEL)
+
+
+register("llm", chat_llm)
+register("embeddings", embeddings)
@@ -0,0 +1,79 @@
+import os
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+CLUSTER_NEIGHBORS = int(os.getenv("CLUSTER_NEIGHBORS", "5"))
+# Distancia L2 (al cuadrado, como devuelve FAISS) máxima para unir dos issues.
+# Con embeddings normalizados equivale a 2 - 2·coseno: 0.3 ≈ coseno 0.85.
+CLUSTER_MAX_DISTANCE = float(os.getenv("CLUSTER_MAX_DISTANCE", "0.3"))
+CLUSTER_SEARCH_BATCH = int(os.getenv("CLUSTER_SEARCH_BATCH", "4096"))
+# Componentes mayores (cadenas de vecinos) no caben en un prompt: se analizan issue a issue.
+CLUSTER_MAX_SIZE = max(2, int(os.getenv("CLUSTER_MAX_SIZE", "8")))
+
+
+class UnionFind:
+    """Conjuntos disjuntos con compresión de caminos y unión por tamaño."""
+
+    def __init__(self, n):
+        self.parent = list(range(n))
+        self.size = [1] * n
+
+    def find(self, x):
+        root = x
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[x] != root:
+            self.parent[x], x = root, self.parent[x]
+        return root
+
+    def union(self, a, b):
+        ra, rb = self.find(a), self.find(b)
+        if ra == rb:
+            return
+        if self.size[ra] < self.size[rb]:
+            ra, rb = rb, ra
+        self.parent[rb] = ra
+        self.size[ra] += self.size[rb]
+
+
+def index_vectors(vector_store):
+    """Devuelve (claves, matriz float32) con todos los vectores del índice (todos sus shards), en orden de id global."""
+    return vector_store.keys(), vector_store.vectors()
+
+
+def knn_edges(vector_store, k=None, max_distance=None):
+    """
+    Busca los k vecinos de todos los vectores del índice en lotes (una pasada
+    vectorizada de FAISS por shard, también entre proyectos) y devuelve las aristas (i, j, distancia) bajo el umbral.
+    """
+    k = k or CLUSTER_NEIGHBORS
+    max_distance = CLUSTER_MAX_DISTANCE if max_distance is None else max_distance
+    keys, vectors = index_vectors(vector_store)
+    edges = []
+    for start in range(0, len(keys), CLUSTER_SEARCH_BATCH):
+        batch = vectors[start:start + CLUSTER_SEARCH_BATCH]
+        distances, ids = vector_store.search(batch, k + 1)
+        rows, cols = np.nonzero((ids >= 0) & (distances <= max_distance))
+        for r, c in zip(rows.tolist(), cols.tolist()):
+            i, j = start + r, int(ids[r, c])
+            if i < j:
+                edges.append((i, j, float(distances[r, c])))
+            elif j < i:
+                edges.append((j, i, float(distances[r, c])))
+    return keys, edges
+
+
+def find_clusters(vector_store, k=None, max_distance=None):
+    """Componentes conexas (de 2 o más issues) del grafo kNN umbralizado, como listas de claves ordenadas."""
+    keys, edges = knn_edges(vector_store, k, max_distance)
+    uf = UnionFind(len(keys))
+    for i, j, _distance in edges:
+        uf.union(i, j)
+    components = {}
+    for i, key in enumerate(keys):
+        components.setdefault(uf.find(i), []).append(key)
+    return sorted(
+        (sorted(members) for members in components.values() if len(members) > 1),
+        key=lambda members: members[0],
+    )
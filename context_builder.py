@@ -0,0 +1,162 @@
+import os
+import re
+from collections import Counter
+from dotenv import load_dotenv
+
+load_dotenv()
+# Presupuesto total del prompt (plantilla + issue actual + vecinos), en tokens estimados.
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "3000"))
+CHARS_PER_TOKEN = float(os.getenv("CHARS_PER_TOKEN", "4"))
+# Parte del presupuesto libre reservada como máximo para el issue actual.
+CURRENT_ISSUE_SHARE = float(os.getenv("CURRENT_ISSUE_SHARE", "0.4"))
+# Se descartan vecinos con distancia > ratio · distancia del vecino más cercano (0 = desactivado).
+CONTEXT_DISTANCE_RATIO = float(os.getenv("CONTEXT_DISTANCE_RATIO", "0"))
+# Un pasaje que aparece en al menos este número de issues del prompt se trata como plantilla.
+BOILERPLATE_MIN_ISSUES = int(os.getenv("BOILERPLATE_MIN_ISSUES", "3"))
+
+TRIM_MARKER = "[...]"
+# Sustituye a los pasajes de plantilla ya mostrados: el LLM sigue viendo que el texto coincide.
+SAME_TEXT_PREFIX = "[mismo texto que "
+CURRENT_ISSUE_LABEL = "el issue actual"
+WORD_RE = re.compile(r"\w+", re.UNICODE)
+PASSAGE_SPLIT_RE = re.compile(r"\n+|(?<=[.!?;])\s+")
+
+
+def estimate_tokens(text):
+    return int(len(text) / CHARS_PER_TOKEN) + 1
+
+
+def split_passages(text):
+    return [p.strip() for p in PASSAGE_SPLIT_RE.split(text or "") if p.strip()]
+
+
+def normalize_passage(passage):
+    return " ".join(WORD_RE.findall(passage.lower()))
+
+
+def word_set(text):
+    return {w for w in WORD_RE.findall(text.lower()) if len(w) > 2}
+
+
+def select_passages(passages, budget_tokens, reference_words=None):
+    """
+    Elige pasajes dentro del presupuesto. Con `reference_words` se priorizan los
+    más parecidos (solapamiento de palabras); si no, se conservan en orden.
+    El resultado mantiene el orden original y marca los huecos con TRIM_MARKER.
+    """
+    if reference_words is None:
+        order = list(range(len(passages)))
+    else:
+        def overlap(i):
+            words = word_set(passages[i])
+            return len(words & reference_words) / (len(words) or 1)
+        # Las referencias a texto repetido van primero: son cortas y la señal más fuerte de duplicado.
+        order = sorted(range(len(passages)), key=lambda i: (not is_same_text_marker(passages[i]), -overlap(i), i))
+
+    chosen, used = set(), 0
+    for i in order:
+        cost = estimate_tokens(passages[i])
+        if used + cost > budget_tokens:
+            continue
+        chosen.add(i)
+        used += cost
+
+    parts, last = [], -1
+    for i in sorted(chosen):
+        if i != last + 1:
+            parts.append(TRIM_MARKER)
+        parts.append(passages[i])
+        last = i
+    if not chosen and passages and budget_tokens > 0:
+        # Ningún pasaje cabe entero: se corta el más relevante.
+        return passages[order[0]][:int(budget_tokens * CHARS_PER_TOKEN)] + " " + TRIM_MARKER
+    if last != len(passages) - 1 and passages:
+        parts.append(TRIM_MARKER)
+    return " ".join(parts)
+
+
+def is_same_text_marker(passage):
+    return passage.startswith(SAME_TEXT_PREFIX)
+
+
+def filter_neighbors(neighbors):
+    """Descarta vecinos poco relevantes respecto al más cercano. `neighbors` = [(clave, datos, distancia)]."""
+    scored = [n for n in neighbors if n[2] is not None]
+    if not CONTEXT_DISTANCE_RATIO or not scored:
+        return neighbors
+    best = min(n[2] for n in scored)
+    cutoff = max(best, 1e-6) * CONTEXT_DISTANCE_RATIO
+    return [n for n in neighbors if n[2] is None or n[2] <= cutoff]
+
+
+def unique_passages(passages):
+    """Quita pasajes repetidos dentro de un mismo issue."""
+    seen, unique = set(), []
+    for p in passages:
+        normalized = normalize_passage(p)
+        if normalized not in seen:
+            seen.add(normalized)
+            unique.append(p)
+    return unique
+
+
+def build_prompt_context(current_issue, neighbors, template_tokens):
+    """
+    Construye el contexto del issue actual y de los vecinos dentro de PROMPT_TOKEN_BUDGET:
+    filtra vecinos poco relevantes, sustituye los pasajes de plantilla repetidos en varios
+    issues por una referencia al issue donde ya se mostraron y recorta cada descripción
+    a los pasajes más parecidos al issue actual.
+    Devuelve (contexto actual, contexto de vecinos, claves de vecinos incluidos).
+    """
+    neighbors = filter_neighbors(neighbors)
+    curr_summary = current_issue.get('summary', 'N/A')
+    current_passages = unique_passages(split_passages(current_issue.get('customfield_10193', 'N/A')))
+    neighbor_passages = [
+        unique_passages(split_passages(data.get('customfield_10193', 'N/A'))) for _key, data, _d in neighbors
+    ]
+
+    # Pasajes compartidos por muchos issues del prompt (plantillas, firmas...): se muestran una vez.
+    issue_counts = Counter()
+    for passages in [current_passages, *neighbor_passages]:
+        issue_counts.update({normalize_passage(p) for p in passages})
+    boilerplate = {p for p, count in issue_counts.items() if count >= BOILERPLATE_MIN_ISSUES and p}
+    # Dónde apareció primero cada pasaje; las repeticiones se sustituyen por una referencia a él
+    # (sin quitarlas en silencio: en duplicados exactos ese texto compartido es la prueba).
+    first_seen = {normalize_passage(p): CURRENT_ISSUE_LABEL for p in current_passages}
+    deduplicated = []
+    for (key, _data, _d), passages in zip(neighbors, neighbor_passages):
+        kept = []
+        for p in passages:
+            normalized = normalize_passage(p)
+            if normalized in boilerplate and normalized in first_seen:
+                marker = f"{SAME_TEXT_PREFIX}{first_seen[normalized]}]"
+                if not kept or kept[-1] != marker:
+                    kept.append(marker)
+                continue
+            first_seen.setdefault(normalized, key)
+            kept.append(p)
+        deduplicated.append(kept)
+    neighbor_passages = deduplicated
+
+    available = max(0, PROMPT_TOKEN_BUDGET - template_tokens - estimate_tokens(curr_summary))
+    current_budget = int(available * CURRENT_ISSUE_SHARE) if neighbors else available
+    curr_description = select_passages(current_passages, current_budget)
+    available -= estimate_tokens(curr_description)
+    clean_current_issue_context = f"Summary: {curr_summary}\nDescription: {curr_description}"
+
+    reference_words = word_set(f"{curr_summary} {' '.join(current_passages)}")
+    similar_issues_context = ""
+    for position, ((key, data, _distance), passages) in enumerate(zip(neighbors, neighbor_passages)):
+        sim_summary = data.get('summary', 'N/A')
+        header = f"- ISSUE {key}:\n  Summary: {sim_summary}\n  Description: \n\n"
+        # El presupuesto restante se reparte entre los vecinos que faltan.
+        share = available // (len(neighbors) - position) - estimate_tokens(header)
+        sim_desc = select_passages(passages, max(0, share), reference_words)
+        entry = (
+            f"- ISSUE {key}:\n"
+            f"  Summary: {sim_summary}\n"
+            f"  Description: {sim_desc}\n\n"
+        )
+        similar_issues_context += entry
+        available -= estimate_tokens(entry)
+    return clean_current_issue_context, similar_issues_context, [key for key, _data, _d in neighbors]
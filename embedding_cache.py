@@ -0,0 +1,112 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import numpy as np
+from dotenv import load_dotenv
+from langchain_core.embeddings import Embeddings
+import metrics
+
+load_dotenv()
+EMBEDDING_CACHE_DB = os.getenv("EMBEDDING_CACHE_DB", "jirax_cache.db")
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Envuelve un modelo de embeddings con una caché SQLite persistente.
+    La clave es (modelo, sha256(texto)); los vectores se guardan como float32
+    y, al superar `max_entries`, se eliminan los de uso más antiguo (LRU).
+    """
+
+    def __init__(self, embeddings, model_name, path=None, max_entries=None):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.max_entries = max_entries or EMBEDDING_CACHE_MAX_ENTRIES
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path or EMBEDDING_CACHE_DB, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+CREATE TABLE IF NOT EXISTS embeddings (
+    model TEXT NOT NULL,
+    text_hash TEXT NOT NULL,
+    vector BLOB NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (model, text_hash)
+)""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used)")
+        self._conn.commit()
+        self._size = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, hashes):
+        found = {}
+        unique = list(dict.fromkeys(hashes))
+        with self._lock:
+            for i in range(0, len(unique), 500):
+                chunk = unique[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? "
+                    f"AND text_hash IN ({', '.join('?' for _ in chunk)})",
+                    [self.model_name, *chunk],
+                ).fetchall()
+                found.update({h: np.frombuffer(v, dtype=np.float32).tolist() for h, v in rows})
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model = ? AND text_hash = ?",
+                    [(now, self.model_name, h) for h in found],
+                )
+                self._conn.commit()
+        return found
+
+    def _store(self, hash_vectors):
+        now = time.time()
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (model, text_hash, vector, last_used) VALUES (?, ?, ?, ?)",
+                [
+                    (self.model_name, h, np.asarray(v, dtype=np.float32).tobytes(), now)
+                    for h, v in hash_vectors.items()
+                ],
+            )
+            self._size += self._conn.total_changes - before
+            if self._size > self.max_entries:
+                overflow = self._size - self.max_entries
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE rowid IN "
+                    "(SELECT rowid FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (overflow,),
+                )
+                self._size -= overflow
+            self._conn.commit()
+
+    def embed_documents(self, texts):
+        hashes = [text_hash(t) for t in texts]
+        cached = self._lookup(hashes)
+        missing = {}
+        for h, t in zip(hashes, texts):
+            if h not in cached and h not in missing:
+                missing[h] = t
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+        metrics.incr("embedding_cache_hits", len(texts) - len(missing))
+        metrics.incr("embedding_cache_misses", len(missing))
+        if missing:
+            with metrics.timer("embed_model"):
+                vectors = self.embeddings.embed_documents(list(missing.values()))
+            metrics.incr("embedded_texts", len(missing))
+            new_vectors = dict(zip(missing.keys(), vectors))
+            self._store(new_vectors)
+            cached.update({h: np.asarray(v, dtype=np.float32).tolist() for h, v in new_vectors.items()})
+        return [cached[h] for h in hashes]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
@@ -1,24 +1,46 @@
-import requests
-from requests.auth import HTTPBasicAuth
 import json
 import csv
 import os
-import time
+import queue
 import tempfile
-import sqlite3
+import threading
 import base64
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 from dotenv import load_dotenv
+import issue_store
+import jira_client
+import metrics
 
 # --- CONFIGURAZIOA ---
 load_dotenv()
 PROJECT_KEY = os.getenv("PROJECT_KEY", "UCM")
+# Proyectos sincronizados, cada uno con su marca de agua y su shard del índice.
+# PROJECT_KEY es el principal (el que se analiza por defecto) y va siempre el primero.
+PROJECT_KEYS = [PROJECT_KEY] + [
+    p.strip().upper() for p in os.getenv("PROJECT_KEYS", "").split(",") if p.strip() and p.strip().upper() != PROJECT_KEY
+]
 MAX_RESULTS = int(os.getenv("MAX_RESULTS", "100"))
 OUTPUT_CSV = os.getenv("OUTPUT_CSV", "ucm_issues.csv")
-OUTPUT_DB = os.getenv("OUTPUT_DB", "ucm_issues.db")
+OUTPUT_DB = issue_store.OUTPUT_DB
+EXPORT_CSV = os.getenv("EXPORT_CSV", "false").lower() in ("1", "true", "yes")
 JIRA_DOMAIN = os.getenv("JIRA_DOMAIN")
 EMAIL = os.getenv("EMAIL")
 API_TOKEN = os.getenv("API_TOKEN")
-JIRA_VERIFY = os.getenv("JIRA_VERIFY", "true").lower() not in ("0", "false", "no")
+JIRA_VERIFY = jira_client.JIRA_VERIFY
+FULL_SYNC = os.getenv("FULL_SYNC", "false").lower() in ("1", "true", "yes")
+# JQL interpreta las fechas en la zona horaria del usuario de Jira, así que
+# la marca de agua se retrasa este margen para no perder cambios por desfase horario.
+SYNC_OVERLAP_MINUTES = int(os.getenv("SYNC_OVERLAP_MINUTES", "1440"))
+SYNC_PRUNE_DELETED = os.getenv("SYNC_PRUNE_DELETED", "true").lower() not in ("0", "false", "no")
+MAX_RESULTS_KEYS = int(os.getenv("MAX_RESULTS_KEYS", "5000"))
+# Páginas descargadas por adelantado mientras se procesan las anteriores.
+SYNC_PREFETCH_PAGES = max(1, int(os.getenv("SYNC_PREFETCH_PAGES", "2")))
+# Hilos que convierten páginas (JSON + ADF) en filas en paralelo con la descarga y la escritura.
+SYNC_TRANSFORM_WORKERS = max(1, int(os.getenv("SYNC_TRANSFORM_WORKERS", "2")))
+
+HEADERS_LIST = issue_store.ISSUE_COLUMNS
 
 # --- HELPERS ---
 def get_safe_value(fields, key):
@@ -29,15 +51,30 @@ def get_safe_value(fields, key):
         return ""
     return str(v)
 
+def adf_text_parts(node, parts):
+    """Recorre un nodo ADF en profundidad (listas, tablas, paneles...) y acumula sus textos en orden."""
+    if isinstance(node, list):
+        for child in node:
+            adf_text_parts(child, parts)
+        return
+    if not isinstance(node, dict):
+        return
+    node_type = node.get("type")
+    if node_type == "text":
+        parts.append(node.get("text", ""))
+    elif node_type in ("mention", "emoji"):
+        text = (node.get("attrs") or {}).get("text")
+        if text:
+            parts.append(text)
+    adf_text_parts(node.get("content"), parts)
+
 def get_doc_text(fields, key):
     doc_data = fields.get(key)
+    if not isinstance(doc_data, dict):
+        return ""
     try:
-        content = doc_data.get("content", []) if isinstance(doc_data, dict) else []
         text_parts = []
-        for block in content:
-            for inline in block.get("content", []):
-                if inline.get("type") == "text":
-                    text_parts.append(inline.get("text", ""))
+        adf_text_parts(doc_data.get("content", []), text_parts)
         return " ".join(text_parts)
     except Exception:
         return ""
@@ -58,17 +95,50 @@ def atomic_write_csv(path, headers, rows):
             except Exception:
                 pass
 
-def fetch_all_issues():
+def load_csv_rows(path):
+    """Lee el CSV local y devuelve {key: fila} conservando el orden de columnas."""
+    if not os.path.exists(path):
+        return {}
+    rows = {}
+    with open(path, mode="r", newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        for record in reader:
+            # Las columnas que falten en CSV antiguos quedan vacías.
+            row = [record.get(h) or "" for h in HEADERS_LIST]
+            if row[0]:
+                rows[row[0]] = row
+    return rows
+
+def parse_jira_datetime(value):
+    try:
+        return datetime.strptime(value, "%Y-%m-%dT%H:%M:%S.%f%z")
+    except (TypeError, ValueError):
+        return None
+
+def get_watermark(conn, project=None):
+    """Devuelve el mayor `updated` almacenado del proyecto (o None si no hay)."""
+    return parse_jira_datetime(issue_store.max_updated(conn, project))
+
+def watermark_to_jql(watermark):
+    since = watermark - timedelta(minutes=SYNC_OVERLAP_MINUTES)
+    return since.strftime('"%Y/%m/%d %H:%M"')
+
+def minutes_to_jql(minutes):
+    """Fecha relativa (`"-15m"`): Jira la resuelve con su propio reloj, sin desfase horario."""
+    return f'"-{max(1, int(minutes))}m"'
+
+def search_request(jql_filter=None, fields_param=None, max_results=None, project=None):
+    """URL, cabeceras y parámetros base de /rest/api/3/search/jql para el proyecto."""
     JIRA_DOMAIN = os.environ.get("JIRA_DOMAIN")
     EMAIL       = os.environ.get("EMAIL")
     API_TOKEN   = os.environ.get("API_TOKEN")
-    PROJECT_KEY = os.environ.get("PROJECT_KEY", "UCM")
-    MAX_RESULTS = int(os.environ.get("MAX_RESULTS", "100"))
+    PROJECT_KEY = project or os.environ.get("PROJECT_KEY", "UCM")
+    MAX_RESULTS = max_results or int(os.environ.get("MAX_RESULTS", "100"))
 
     if not all([JIRA_DOMAIN, EMAIL, API_TOKEN]):
         raise RuntimeError("Faltan JIRA_DOMAIN, EMAIL o API_TOKEN en el entorno.")
 
-    url = f"https://{JIRA_DOMAIN}/rest/api/3/search/jql"
+    url = f"{jira_client.base_url()}/rest/api/3/search/jql"
 
     fields_list = [
         "summary",
@@ -88,109 +158,244 @@ def fetch_all_issues():
         "customfield_10213",  # Transversal
         "customfield_10193",  # Descripción / Objectives
         "customfield_10536",  # Decision
+        "customfield_10602",  # Duplicados (lo escribe el agente)
     ]
-    fields_param = ",".join(fields_list)
+    fields_param = fields_param or ",".join(fields_list)
 
-    session = requests.Session()
-    session.auth = HTTPBasicAuth(EMAIL, API_TOKEN)  
-    #session.verify = False # Solo dentro de la empresa por proxy y firewall!!!
     headers = {"Accept": "application/json"}
+    jql = f"project={PROJECT_KEY}"
+    if jql_filter:
+        jql = f"{jql} AND {jql_filter}"
     base_params = {
-        "jql": f"project={PROJECT_KEY}",
+        "jql": jql,
         "maxResults": MAX_RESULTS,
         "fields": fields_param
     }
+    return url, headers, base_params
 
-    all_issues = []
-    next_token = None
-    page = 1
+_END_OF_PAGES = object()
 
-    while True:
-        params = dict(base_params)
-        if next_token:
-            params["nextPageToken"] = next_token
+def iter_issue_pages(jql_filter=None, fields_param=None, max_results=None, prefetch=None, project=None):
+    """
+    Generador de páginas de issues (una lista por página). Un hilo descarga las
+    páginas siguientes mientras el llamador procesa la actual, con como mucho
+    `prefetch` (SYNC_PREFETCH_PAGES) en cola, así que la memoria no crece con el
+    tamaño del proyecto. Un error de Jira se relanza en el llamador.
+    """
+    url, headers, base_params = search_request(jql_filter, fields_param, max_results, project)
+    pages = queue.Queue(maxsize=prefetch or SYNC_PREFETCH_PAGES)
+    stop = threading.Event()
 
+    def put(item):
+        while not stop.is_set():
+            try:
+                pages.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def download():
+        next_token = None
         try:
-            resp = session.get(url, headers=headers, params=params, timeout=30)
-            resp.raise_for_status()
+            while True:
+                params = dict(base_params)
+                if next_token:
+                    params["nextPageToken"] = next_token
+                with metrics.timer("fetch_page"):
+                    resp = jira_client.request("GET", url, headers=headers, params=params)
+                    resp.raise_for_status()
+                    data = resp.json()
+                issues = data.get("issues", [])
+                metrics.incr("fetched_issues", len(issues))
+                next_token = data.get("nextPageToken")
+                if not put(issues):
+                    return
+                if not next_token:
+                    break
         except Exception as e:
-            print(f"Error al llamar a JIRA: {e}")
-            break
-
-        data = resp.json()
-        issues = data.get("issues", [])
-        all_issues.extend(issues)
-        print(f"Página {page}: recibidas {len(issues)} issues (acumuladas: {len(all_issues)}).")
-        next_token = data.get("nextPageToken")
-        if not next_token:
-            break
-
-        page += 1
-        time.sleep(0.2)  
-
-    return all_issues
-
-def fetch_and_save_issues():
-    issues = fetch_all_issues()
-    if not issues:
-        print("No se obtuvieron issues.")
-        return
+            put(e)
+            return
+        put(_END_OF_PAGES)
+
+    downloader = threading.Thread(target=download, daemon=True)
+    downloader.start()
+    page, total = 1, 0
+    try:
+        while True:
+            item = pages.get()
+            if item is _END_OF_PAGES:
+                return
+            if isinstance(item, Exception):
+                print(f"Error al llamar a JIRA: {item}")
+                # Una descarga parcial no es válida como sincronización: el llamador decide.
+                raise item
+            total += len(item)
+            print(f"Página {page}: recibidas {len(item)} issues (acumuladas: {total}).")
+            yield item
+            page += 1
+    finally:
+        stop.set()
+        downloader.join()
+
+def fetch_all_keys(project=None):
+    """Lista todas las claves vivas del proyecto (solo `key`, páginas grandes)."""
+    keys = set()
+    for page in iter_issue_pages(fields_param="key", max_results=MAX_RESULTS_KEYS, project=project):
+        keys.update(issue.get("key") for issue in page if issue.get("key"))
+    return keys
 
-    headers_list = [
-        "key", "summary", "customfield_10190", "customfield_10191", "customfield_10192", "assignee",
-        "status", "customfield_10196", "customfield_10194", "customfield_10341", "customfield_10342",
-        "customfield_10222", "customfield_10248", "customfield_10213", "created", "updated", "customfield_10193", "customfield_10536"
+def issue_to_row(issue):
+    fields = issue.get("fields", {}) or {}
+    issue_key = issue.get("key", "")
+
+    summary   = fields.get("summary", "") or ""
+    owner_value = get_safe_value(fields, "customfield_10192")
+    business_value = get_safe_value(fields, "customfield_10190")
+    area_value     = get_safe_value(fields, "customfield_10191")
+    main_impact_type_value = get_safe_value(fields, "customfield_10196")
+    type_value  = get_safe_value(fields, "customfield_10194")
+    value_value = get_safe_value(fields, "customfield_10220")
+    feasibility_value = get_safe_value(fields, "customfield_10221")
+    prioridad_value   = get_safe_value(fields, "customfield_10222")
+    riesgo_value      = get_safe_value(fields, "customfield_10248")
+    transversal       = get_safe_value(fields, "customfield_10213")
+    assignee_value = (fields.get("assignee") or {}).get("displayName", "")
+    status_value   = (fields.get("status") or {}).get("name", "")
+    created = fields.get("created", "")
+    updated = fields.get("updated", "")
+    descripcion_objectives = get_doc_text(fields, "customfield_10193")
+    decision_value = get_safe_value(fields, "customfield_10536")
+    duplicates_value = get_safe_value(fields, "customfield_10602")
+
+    # CSV row
+    return [
+        issue_key,
+        summary,
+        business_value,
+        area_value,
+        owner_value,
+        assignee_value,
+        status_value,
+        main_impact_type_value,
+        type_value,
+        value_value,
+        feasibility_value,
+        prioridad_value,
+        riesgo_value,
+        transversal,
+        created,
+        updated,
+        descripcion_objectives,
+        decision_value,
+        duplicates_value
     ]
 
-    csv_rows = []
-
-
-    for issue in issues:
-        fields = issue.get("fields", {}) or {}
-        issue_key = issue.get("key", "")
-
-        summary   = fields.get("summary", "") or ""
-        owner_value = get_safe_value(fields, "customfield_10192")
-        business_value = get_safe_value(fields, "customfield_10190")
-        area_value     = get_safe_value(fields, "customfield_10191")
-        main_impact_type_value = get_safe_value(fields, "customfield_10196")
-        type_value  = get_safe_value(fields, "customfield_10194")
-        value_value = get_safe_value(fields, "customfield_10220")
-        feasibility_value = get_safe_value(fields, "customfield_10221")
-        prioridad_value   = get_safe_value(fields, "customfield_10222")
-        riesgo_value      = get_safe_value(fields, "customfield_10248")
-        transversal       = get_safe_value(fields, "customfield_10213")
-        assignee_value = (fields.get("assignee") or {}).get("displayName", "")
-        status_value   = (fields.get("status") or {}).get("name", "")
-        created = fields.get("created", "")
-        updated = fields.get("updated", "")
-        descripcion_objectives = get_doc_text(fields, "customfield_10193")
-        decision_value = get_safe_value(fields, "customfield_10536")
-
-        # CSV row
-        csv_rows.append([
-            issue_key,
-            summary,
-            business_value,
-            area_value,
-            owner_value,
-            assignee_value,
-            status_value,
-            main_impact_type_value,
-            type_value,
-            value_value,
-            feasibility_value,
-            prioridad_value,
-            riesgo_value,
-            transversal,
-            created,
-            updated,
-            descripcion_objectives,
-            decision_value
-        ])
-
-    atomic_write_csv(OUTPUT_CSV, headers_list, csv_rows)
+def import_legacy_csv(conn):
+    """Migra una sola vez el CSV de versiones anteriores a la base de datos."""
+    with metrics.timer("csv_load"):
+        rows = load_csv_rows(OUTPUT_CSV)
+    if rows:
+        issue_store.upsert_rows(conn, list(rows.values()))
+        print(f"Importadas {len(rows)} issues desde {OUTPUT_CSV} a {OUTPUT_DB}.")
+
+def export_csv(conn):
+    atomic_write_csv(OUTPUT_CSV, HEADERS_LIST, issue_store.iter_rows(conn))
     print(f"CSV guardado en: {OUTPUT_CSV}")
 
+def transform_page(issues):
+    with metrics.timer("transform"):
+        return [row for row in (issue_to_row(issue) for issue in issues) if row[0]]
+
+def write_pages(conn, pages):
+    """
+    Convierte cada página en filas en un pool de SYNC_TRANSFORM_WORKERS hilos y las
+    escribe en orden, según llegan, en la transacción abierta de `conn`: mientras se
+    escribe una página se transforman las siguientes y se descarga la próxima.
+    Devuelve el conjunto de claves escritas.
+    """
+    written = set()
+    pending = deque()
+
+    def write_ready(limit):
+        while len(pending) > limit:
+            rows = pending.popleft().result()
+            with metrics.timer("db_upsert"):
+                issue_store.write_rows(conn, rows)
+            written.update(row[0] for row in rows)
+
+    with ThreadPoolExecutor(max_workers=SYNC_TRANSFORM_WORKERS) as pool:
+        for issues in pages:
+            pending.append(pool.submit(transform_page, issues))
+            write_ready(SYNC_TRANSFORM_WORKERS)
+        write_ready(0)
+    return written
+
+def sync_project(conn, project, full, prune, since_minutes=None):
+    """
+    Sincroniza un proyecto con su propia marca de agua. Las páginas se escriben según
+    llegan, pero en una sola transacción: si la descarga falla a medias no se confirma
+    nada (ni avanza la marca de agua). Los borrados solo afectan a claves del proyecto.
+    Con `since_minutes` la sincronización incremental pide solo los últimos minutos
+    (en lugar de la marca de agua menos SYNC_OVERLAP_MINUTES).
+    """
+    watermark = None if full else get_watermark(conn, project)
+
+    if watermark is None:
+        print(f"Sincronización completa del proyecto {project}...")
+        try:
+            with conn:
+                live_keys = write_pages(conn, iter_issue_pages(project=project))
+                if not live_keys:
+                    print(f"No se obtuvieron issues de {project}.")
+                    return False
+        except Exception as e:
+            print(f"No se pudo completar la descarga de {project} ({e}); se conserva la base de datos actual.")
+            return False
+    else:
+        since = minutes_to_jql(since_minutes) if since_minutes else watermark_to_jql(watermark)
+        jql_filter = f"updated >= {since}"
+        print(f"Sincronización incremental de {project} ({jql_filter})...")
+        try:
+            with conn:
+                written = write_pages(conn, iter_issue_pages(jql_filter=jql_filter, project=project))
+                live_keys = fetch_all_keys(project) if prune else None
+        except Exception as e:
+            print(f"No se pudo completar la sincronización de {project} ({e}); se conserva la base de datos actual.")
+            return False
+        print(f"Issues nuevas o modificadas en {project}: {len(written)}.")
+
+    deleted = [k for k in issue_store.all_keys(conn, project) if k not in live_keys] if live_keys is not None else []
+    issue_store.delete_keys(conn, deleted)
+    if deleted:
+        print(f"Issues eliminadas en Jira ({project}): {len(deleted)}.")
+    return True
+
+def fetch_and_save_issues(full=None, prune=None, projects=None, since_minutes=None):
+    """
+    Sincroniza Jira con la base de datos local (OUTPUT_DB), proyecto a proyecto
+    (`projects`, por defecto PROJECT_KEYS). En modo incremental solo descarga las
+    issues con `updated >= marca de agua del proyecto`, las inserta/actualiza por
+    clave y elimina las claves borradas en Jira (si `prune`, por defecto
+    SYNC_PRUNE_DELETED). Un proyecto que falla no deshace los demás. El modo
+    vigilancia pasa `since_minutes` para pedir solo lo cambiado desde su último sondeo.
+    Devuelve True si todos los proyectos quedaron sincronizados.
+    """
+    full = FULL_SYNC if full is None else full
+    prune = SYNC_PRUNE_DELETED if prune is None else prune
+    conn = issue_store.connect(OUTPUT_DB)
+    try:
+        if not full and not issue_store.all_keys(conn):
+            import_legacy_csv(conn)
+        synced = [sync_project(conn, project, full, prune, since_minutes) for project in (projects or PROJECT_KEYS)]
+        if not any(synced):
+            return False
+        print(f"Base de datos actualizada: {OUTPUT_DB}")
+        if EXPORT_CSV:
+            export_csv(conn)
+        return all(synced)
+    finally:
+        conn.close()
+
 if __name__ == "__main__":
     fetch_and_save_issues()
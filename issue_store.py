@@ -0,0 +1,300 @@
+import os
+import sqlite3
+import sys
+import threading
+from dotenv import load_dotenv
+
+load_dotenv()
+OUTPUT_DB = os.getenv("OUTPUT_DB", "ucm_issues.db")
+
+ISSUE_COLUMNS = [
+    "key", "summary", "customfield_10190", "customfield_10191", "customfield_10192", "assignee",
+    "status", "customfield_10196", "customfield_10194", "customfield_10341", "customfield_10342",
+    "customfield_10222", "customfield_10248", "customfield_10213", "created", "updated", "customfield_10193", "customfield_10536",
+    "customfield_10602"
+]
+# Columnas que el agente lee para construir contexto y embeddings, y el campo que escribe.
+AGENT_COLUMNS = ("summary", "customfield_10193", "customfield_10602")
+# Clave de issue de Jira: proyecto (letra inicial, luego letras, dígitos o _) + número.
+ISSUE_KEY_PATTERN = r"([A-Z][A-Z0-9_]+-\d+)"
+
+
+def project_of(key):
+    """Proyecto de una clave de issue (UCM-7 -> UCM)."""
+    return key.rsplit("-", 1)[0]
+
+
+def project_condition(project):
+    """Condición SQL (y parámetros) de las claves de `project`: rango por la clave primaria."""
+    if not project:
+        return "1", ()
+    # "." es el carácter siguiente a "-": el rango [UCM-, UCM.) contiene justo las claves UCM-*.
+    return "key >= ? AND key < ?", (f"{project}-", f"{project}.")
+
+
+def connect(path=None, check_same_thread=True):
+    """Abre la base de datos de issues y garantiza que el esquema existe."""
+    conn = sqlite3.connect(path or OUTPUT_DB, check_same_thread=check_same_thread)
+    conn.execute("PRAGMA journal_mode=WAL")
+    ensure_schema(conn)
+    return conn
+
+
+def ensure_schema(conn):
+    columns_sql = ",\n    ".join(f"{c} TEXT NOT NULL DEFAULT ''" for c in ISSUE_COLUMNS if c != "key")
+    conn.execute(f"""
+CREATE TABLE IF NOT EXISTS issues (
+    key TEXT PRIMARY KEY,
+    {columns_sql}
+)""")
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(issues)")}
+    added = [c for c in ISSUE_COLUMNS if c not in existing]
+    for column in added:
+        conn.execute(f"ALTER TABLE issues ADD COLUMN {column} TEXT NOT NULL DEFAULT ''")
+    if added:
+        # Las filas existentes no tienen datos para las columnas nuevas: se vacía
+        # `updated` para que la siguiente sincronización vuelva a descargarlas todas.
+        conn.execute("UPDATE issues SET updated = ''")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_issues_updated ON issues(updated)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_issues_status ON issues(status)")
+    conn.commit()
+
+
+def write_rows(conn, rows):
+    """Como upsert_rows pero sin confirmar: para escribir varias páginas en una sola transacción."""
+    placeholders = ", ".join("?" for _ in ISSUE_COLUMNS)
+    updates = ", ".join(f"{c}=excluded.{c}" for c in ISSUE_COLUMNS if c != "key")
+    conn.executemany(
+        f"INSERT INTO issues ({', '.join(ISSUE_COLUMNS)}) VALUES ({placeholders}) "
+        f"ON CONFLICT(key) DO UPDATE SET {updates}",
+        rows,
+    )
+
+
+def upsert_rows(conn, rows):
+    """Inserta o actualiza filas (listas en el orden de ISSUE_COLUMNS)."""
+    with conn:
+        write_rows(conn, rows)
+
+
+def delete_keys(conn, keys):
+    with conn:
+        conn.executemany("DELETE FROM issues WHERE key = ?", [(k,) for k in keys])
+
+
+def all_keys(conn, project=None):
+    condition, params = project_condition(project)
+    return [row[0] for row in conn.execute(f"SELECT key FROM issues WHERE {condition}", params)]
+
+
+def max_updated(conn, project=None):
+    condition, params = project_condition(project)
+    row = conn.execute(f"SELECT MAX(updated) FROM issues WHERE updated != '' AND {condition}", params).fetchone()
+    return row[0] if row else None
+
+
+def iter_rows(conn):
+    yield from conn.execute(f"SELECT {', '.join(ISSUE_COLUMNS)} FROM issues ORDER BY key")
+
+
+class IssueStore:
+    """
+    Vista sobre la tabla `issues` con interfaz tipo diccionario.
+    Las búsquedas por clave van a SQLite y solo leen las columnas indicadas;
+    `update_fields` refleja en local lo que el agente ya escribió en Jira.
+    """
+
+    def __init__(self, path=None, columns=AGENT_COLUMNS):
+        self.path = path or OUTPUT_DB
+        self.columns = tuple(columns)
+        self._lock = threading.Lock()
+        self._conn = connect(self.path, check_same_thread=False)
+        self._select = f"SELECT {', '.join(self.columns)} FROM issues WHERE key = ?"
+
+    def get(self, key, default=None):
+        with self._lock:
+            row = self._conn.execute(self._select, (key,)).fetchone()
+        if row is None:
+            return default
+        return dict(zip(self.columns, row))
+
+    def get_columns(self, key, columns):
+        """Lee columnas arbitrarias de ISSUE_COLUMNS para una clave (None si no existe)."""
+        columns = [c for c in columns if c in ISSUE_COLUMNS]
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(columns)} FROM issues WHERE key = ?", (key,)
+            ).fetchone()
+        return dict(zip(columns, row)) if row else None
+
+    def __getitem__(self, key):
+        issue = self.get(key)
+        if issue is None:
+            raise KeyError(key)
+        return issue
+
+    def __contains__(self, key):
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM issues WHERE key = ?", (key,)).fetchone() is not None
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM issues").fetchone()[0]
+
+    def keys(self):
+        with self._lock:
+            return all_keys(self._conn)
+
+    def keys_updated_since(self, since):
+        """Claves con `updated` >= `since` (texto ISO, p. ej. 2024-05-01 o 2024-05-01T08:00)."""
+        with self._lock:
+            return [
+                row[0] for row in self._conn.execute(
+                    "SELECT key FROM issues WHERE updated >= ? ORDER BY key", (since.replace(" ", "T"),)
+                )
+            ]
+
+    def max_updated(self):
+        with self._lock:
+            return max_updated(self._conn)
+
+    def items(self, batch_size=1000):
+        """Recorre todas las issues en bloques sin cargar la tabla entera en memoria."""
+        query = (
+            f"SELECT key, {', '.join(self.columns)} FROM issues "
+            f"WHERE key > ? ORDER BY key LIMIT ?"
+        )
+        last_key = ""
+        while True:
+            with self._lock:
+                rows = self._conn.execute(query, (last_key, batch_size)).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield row[0], dict(zip(self.columns, row[1:]))
+            last_key = rows[-1][0]
+
+    def update_fields(self, key, fields):
+        columns = [c for c in fields if c in ISSUE_COLUMNS and c != "key"]
+        if not columns:
+            return
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"UPDATE issues SET {', '.join(f'{c} = ?' for c in columns)} WHERE key = ?",
+                [fields[c] for c in columns] + [key],
+            )
+
+    def close(self):
+        self._conn.close()
+
+
+class IssueTable:
+    """
+    Copia compacta en memoria de las columnas del agente, organizada por columnas:
+    cada issue tiene un id entero (posición en las listas) y su clave se interna.
+    Con `align()` los ids coinciden con los del índice FAISS, así que un vecino
+    devuelto por FAISS se resuelve por posición. Las demás columnas se leen bajo
+    demanda de SQLite con `field()`. Expone la misma interfaz que IssueStore.
+    """
+
+    def __init__(self, store, columns=AGENT_COLUMNS):
+        self.store = store
+        self.column_names = tuple(columns)
+        self._lock = threading.Lock()
+        self._keys = []
+        self._ids = {}
+        self._columns = {c: [] for c in self.column_names}
+        self._load(store.items())
+
+    def _load(self, rows):
+        keys, columns = [], {c: [] for c in self.column_names}
+        for key, issue in rows:
+            keys.append(sys.intern(key))
+            for c in self.column_names:
+                columns[c].append(issue.get(c, ""))
+        self._keys = keys
+        self._ids = {k: i for i, k in enumerate(keys)}
+        self._columns = columns
+
+    def _rows(self, keys):
+        for key in keys:
+            i = self._ids[key]
+            yield key, {c: self._columns[c][i] for c in self.column_names}
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, key):
+        return key in self._ids
+
+    def __getitem__(self, key):
+        issue = self.get(key)
+        if issue is None:
+            raise KeyError(key)
+        return issue
+
+    def get(self, key, default=None):
+        i = self._ids.get(key)
+        if i is None:
+            return default
+        return {c: self._columns[c][i] for c in self.column_names}
+
+    def id_of(self, key):
+        return self._ids.get(key)
+
+    def key_of(self, issue_id):
+        return self._keys[issue_id]
+
+    def field(self, key, column):
+        """Valor de cualquier columna: de memoria si es del agente, si no de SQLite."""
+        if column in self._columns:
+            i = self._ids.get(key)
+            return None if i is None else self._columns[column][i]
+        row = self.store.get_columns(key, [column])
+        return row[column] if row else None
+
+    def keys(self):
+        return list(self._keys)
+
+    def items(self, batch_size=None):
+        yield from self._rows(list(self._keys))
+
+    def keys_updated_since(self, since):
+        return self.store.keys_updated_since(since)
+
+    def max_updated(self):
+        return self.store.max_updated()
+
+    def update_fields(self, key, fields):
+        self.store.update_fields(key, fields)
+        with self._lock:
+            i = self._ids.get(key)
+            if i is None:
+                return
+            for c, v in fields.items():
+                if c in self._columns:
+                    self._columns[c][i] = v
+
+    def align(self, ordered_keys):
+        """Reordena los ids para que el issue `ordered_keys[i]` tenga el id i; el resto va detrás."""
+        ordered_keys = [k for k in ordered_keys if k in self._ids]
+        placed = set(ordered_keys)
+        order = ordered_keys + [k for k in self._keys if k not in placed]
+        with self._lock:
+            self._load(list(self._rows(order)))
+
+    def refresh(self, keys=None):
+        """
+        Vuelve a leer de SQLite las claves indicadas (nuevas o modificadas) y descarta
+        las que ya no existen. Sin `keys` recarga la tabla entera.
+        """
+        if keys is None:
+            with self._lock:
+                self._load(self.store.items())
+            return
+        live_keys = set(self.store.keys())
+        fresh = {key: self.store.get_columns(key, self.column_names) for key in keys}
+        with self._lock:
+            rows = [(k, row) for k, row in self._rows(self._keys) if k in live_keys and k not in fresh]
+            rows.extend((k, row) for k, row in fresh.items() if row is not None)
+            self._load(rows)
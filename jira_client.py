@@ -0,0 +1,129 @@
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+import requests
+from requests.adapters import HTTPAdapter
+from requests.auth import HTTPBasicAuth
+from dotenv import load_dotenv
+import metrics
+
+load_dotenv()
+JIRA_VERIFY = os.getenv("JIRA_VERIFY", "true").lower() not in ("0", "false", "no")
+JIRA_TIMEOUT = float(os.getenv("JIRA_TIMEOUT", "30"))
+JIRA_MAX_RETRIES = int(os.getenv("JIRA_MAX_RETRIES", "5"))
+JIRA_BACKOFF_BASE = float(os.getenv("JIRA_BACKOFF_BASE", "1.0"))
+JIRA_BACKOFF_MAX = float(os.getenv("JIRA_BACKOFF_MAX", "60"))
+# Peticiones por segundo permitidas (token bucket) y ráfaga máxima.
+JIRA_RATE_LIMIT = float(os.getenv("JIRA_RATE_LIMIT", "10"))
+JIRA_RATE_BURST = int(os.getenv("JIRA_RATE_BURST", "10"))
+JIRA_POOL_SIZE = int(os.getenv("JIRA_POOL_SIZE", "16"))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "PUT", "DELETE", "OPTIONS"}
+
+
+class TokenBucket:
+    """Limitador de ritmo compartido entre hilos."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+_session = None
+_session_lock = threading.Lock()
+_bucket = TokenBucket(JIRA_RATE_LIMIT, JIRA_RATE_BURST)
+
+
+def get_session():
+    """Sesión HTTP única (keep-alive y pool de conexiones) para todas las llamadas a Jira."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            session.auth = HTTPBasicAuth(os.getenv("EMAIL"), os.getenv("API_TOKEN"))
+            session.verify = JIRA_VERIFY
+            adapter = HTTPAdapter(pool_connections=JIRA_POOL_SIZE, pool_maxsize=JIRA_POOL_SIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+        return _session
+
+
+def base_url():
+    """URL base de la API: JIRA_BASE_URL (p. ej. un servidor local de pruebas) o https://JIRA_DOMAIN."""
+    return (os.getenv("JIRA_BASE_URL") or f"https://{os.getenv('JIRA_DOMAIN')}").rstrip("/")
+
+
+def retry_after_seconds(response):
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_seconds(attempt):
+    """Backoff exponencial con jitter completo."""
+    return random.uniform(0, min(JIRA_BACKOFF_MAX, JIRA_BACKOFF_BASE * (2 ** attempt)))
+
+
+def request(method, url, **kwargs):
+    """
+    Hace una petición a Jira respetando el límite de ritmo. Reintenta errores de
+    conexión, 429 y 5xx (estos últimos solo en métodos idempotentes) con backoff,
+    usando `Retry-After` cuando Jira lo envía. Devuelve la última respuesta.
+    """
+    method = method.upper()
+    kwargs.setdefault("timeout", JIRA_TIMEOUT)
+    session = get_session()
+    retry_statuses = RETRY_STATUSES if method in IDEMPOTENT_METHODS else {429}
+    attempt = 0
+    while True:
+        _bucket.acquire()
+        started = time.perf_counter()
+        try:
+            response = session.request(method, url, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            metrics.incr("jira_responses", method=method, status="connection_error")
+            if attempt >= JIRA_MAX_RETRIES:
+                raise
+            delay = backoff_seconds(attempt)
+            print(f"Jira {method} {url} failed ({e}); retrying in {delay:.1f}s.")
+        else:
+            metrics.observe("jira_request_seconds", time.perf_counter() - started, method=method)
+            metrics.incr("jira_responses", method=method, status=response.status_code)
+            if response.status_code not in retry_statuses or attempt >= JIRA_MAX_RETRIES:
+                return response
+            delay = retry_after_seconds(response)
+            if delay is None:
+                delay = backoff_seconds(attempt)
+            print(f"Jira {method} {url} returned {response.status_code}; retrying in {delay:.1f}s.")
+        metrics.incr("jira_retries", method=method)
+        time.sleep(delay)
+        attempt += 1
@@ -0,0 +1,218 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import zlib
+import numpy as np
+from dotenv import load_dotenv
+import metrics
+
+load_dotenv()
+LEXICAL_PREFILTER = os.getenv("LEXICAL_PREFILTER", "true").lower() not in ("0", "false", "no")
+LEXICAL_SHINGLE_SIZE = int(os.getenv("LEXICAL_SHINGLE_SIZE", "3"))
+# num_perm = bands · rows; con 64 = 16 · 4 el umbral de LSH ronda Jaccard ≈ (1/16)^(1/4) = 0.5.
+LEXICAL_NUM_PERM = int(os.getenv("LEXICAL_NUM_PERM", "64"))
+LEXICAL_BANDS = int(os.getenv("LEXICAL_BANDS", "16"))
+# Jaccard estimado mínimo para añadir un candidato a los vecinos de FAISS.
+LEXICAL_CANDIDATE_THRESHOLD = float(os.getenv("LEXICAL_CANDIDATE_THRESHOLD", "0.5"))
+# Jaccard estimado a partir del cual se marca ❗ sin LLM (p. ej. 0.9). Vacío = desactivado,
+# como la puerta por distancia: sin configurarla, los casi-duplicados solo son candidatos.
+LEXICAL_DUPLICATE_THRESHOLD = float(os.getenv("LEXICAL_DUPLICATE_THRESHOLD", "") or "inf")
+LEXICAL_MAX_CANDIDATES = int(os.getenv("LEXICAL_MAX_CANDIDATES", "3"))
+# Firmas MinHash guardadas por clave y hash del texto: al arrancar solo se recalculan las cambiadas.
+LEXICAL_CACHE_DB = os.getenv("LEXICAL_CACHE_DB", "jirax_cache.db")
+
+WORD_RE = re.compile(r"\w+", re.UNICODE)
+FNV_PRIME = np.uint64(0x100000001B3)
+
+
+def lexical_text(issue_data):
+    """Texto comparado léxicamente: summary + customfield_10193."""
+    return f"{issue_data.get('summary', '')} {issue_data.get('customfield_10193', '')}"
+
+
+def shingle_hashes(text, size=None):
+    """Hashes (crc32) de los k-gramas de palabras del texto normalizado."""
+    size = size or LEXICAL_SHINGLE_SIZE
+    tokens = WORD_RE.findall(text.lower())
+    if len(tokens) < size:
+        grams = {" ".join(tokens)} if tokens else set()
+    else:
+        grams = {" ".join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)}
+    return np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64, count=len(grams))
+
+
+class LexicalIndex:
+    """
+    Índice MinHash + LSH en memoria para encontrar casi-duplicados literales.
+    Las firmas se agrupan en bandas; cada banda se guarda ordenada y la consulta
+    busca las filas con la misma banda por búsqueda binaria. La similitud devuelta
+    es el Jaccard estimado (fracción de posiciones iguales en la firma).
+    """
+
+    def __init__(self, num_perm=None, bands=None, seed=1):
+        self.num_perm = num_perm or LEXICAL_NUM_PERM
+        self.bands = bands or LEXICAL_BANDS
+        if self.num_perm % self.bands:
+            raise ValueError(f"LEXICAL_NUM_PERM ({self.num_perm}) must be a multiple of LEXICAL_BANDS ({self.bands})")
+        self.rows = self.num_perm // self.bands
+        # Lo que determina una firma: si cambia, las firmas guardadas no sirven.
+        self.params = f"perm={self.num_perm};shingle={LEXICAL_SHINGLE_SIZE};seed={seed}"
+        rng = np.random.default_rng(seed)
+        # Hashing multiplicativo (a·x + b) >> 32 sobre enteros de 64 bits: una permutación por posición.
+        self.a = rng.integers(1, 2 ** 63, size=self.num_perm, dtype=np.uint64) | np.uint64(1)
+        self.b = rng.integers(0, 2 ** 63, size=self.num_perm, dtype=np.uint64)
+        self.keys = []
+        self.key_to_row = {}
+        self.signatures = np.zeros((0, self.num_perm), dtype=np.uint32)
+        self.band_keys = np.zeros((0, self.bands), dtype=np.uint64)
+        self._pending = {}
+        self._order = None
+        self._sorted = None
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.key_to_row)
+
+    def signature(self, hashes):
+        values = (np.outer(hashes, self.a) + self.b) >> np.uint64(32)
+        return values.min(axis=0).astype(np.uint32)
+
+    def _band_keys(self, signatures):
+        banded = signatures.reshape(len(signatures), self.bands, self.rows).astype(np.uint64)
+        keys = np.zeros((len(signatures), self.bands), dtype=np.uint64)
+        for i in range(self.rows):
+            keys = (keys * FNV_PRIME) ^ banded[:, :, i]
+        return keys
+
+    def add(self, key, text):
+        """Añade o sustituye un issue y devuelve su firma. Los textos vacíos no se indexan (None)."""
+        hashes = shingle_hashes(text)
+        signature = self.signature(hashes) if len(hashes) else None
+        with self._lock:
+            self.remove(key)
+            if signature is not None:
+                self.add_signature(key, signature)
+        return signature
+
+    def add_signature(self, key, signature):
+        """Añade o sustituye un issue con una firma ya calculada."""
+        with self._lock:
+            self.remove(key)
+            self._pending[key] = signature
+            self._order = None
+
+    def remove(self, key):
+        with self._lock:
+            self.key_to_row.pop(key, None)
+            self._pending.pop(key, None)
+
+    def retain(self, keys):
+        """Descarta los issues que ya no están en `keys`."""
+        keys = set(keys)
+        for key in [k for k in self.key_to_row if k not in keys]:
+            self.remove(key)
+
+    def _flush(self):
+        if self._pending:
+            start = len(self.keys)
+            pending_keys = list(self._pending)
+            signatures = np.vstack(list(self._pending.values()))
+            self.keys.extend(pending_keys)
+            self.key_to_row.update({k: start + i for i, k in enumerate(pending_keys)})
+            self.signatures = np.vstack([self.signatures, signatures])
+            self.band_keys = np.vstack([self.band_keys, self._band_keys(signatures)])
+            self._pending = {}
+        if self._order is None:
+            self._order = np.argsort(self.band_keys, axis=0, kind="stable")
+            self._sorted = np.take_along_axis(self.band_keys, self._order, axis=0)
+
+    def flush(self):
+        """Incorpora los issues añadidos y reordena las bandas (lo hace también la primera consulta)."""
+        with self._lock:
+            self._flush()
+
+    def query(self, key, min_similarity=None, limit=None):
+        """Issues que comparten alguna banda con `key` y superan `min_similarity`: [(clave, Jaccard estimado)]."""
+        min_similarity = LEXICAL_CANDIDATE_THRESHOLD if min_similarity is None else min_similarity
+        with self._lock:
+            self._flush()
+            row = self.key_to_row.get(key)
+            if row is None:
+                return []
+            candidates = set()
+            for band in range(self.bands):
+                value = self.band_keys[row, band]
+                lo = np.searchsorted(self._sorted[:, band], value, side="left")
+                hi = np.searchsorted(self._sorted[:, band], value, side="right")
+                candidates.update(self._order[lo:hi, band].tolist())
+            # Filas de claves eliminadas o sustituidas por una versión posterior.
+            candidates = [c for c in candidates if c != row and self.key_to_row.get(self.keys[c]) == c]
+            if not candidates:
+                return []
+            similarity = (self.signatures[candidates] == self.signatures[row]).mean(axis=1)
+        matches = sorted(
+            ((self.keys[c], float(s)) for c, s in zip(candidates, similarity) if s >= min_similarity),
+            key=lambda match: (-match[1], match[0]),
+        )
+        return matches[:limit] if limit else matches
+
+
+def lexical_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def open_signature_db(path=None):
+    conn = sqlite3.connect(path or LEXICAL_CACHE_DB)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("""
+CREATE TABLE IF NOT EXISTS lexical_signatures (
+    key TEXT PRIMARY KEY,
+    params TEXT NOT NULL,
+    text_hash TEXT NOT NULL,
+    signature BLOB NOT NULL
+)""")
+    return conn
+
+
+def build_lexical_index(all_issues_data, path=None):
+    """
+    Construye el índice léxico de todos los issues (recorrido por bloques del IssueStore).
+    Las firmas se guardan en LEXICAL_CACHE_DB con el hash del texto: solo se recalculan
+    las de issues nuevos o con texto cambiado y se borran las de issues que ya no existen.
+    """
+    index = LexicalIndex()
+    conn = open_signature_db(path)
+    try:
+        stored = {
+            key: (text_hash, signature) for key, text_hash, signature in conn.execute(
+                "SELECT key, text_hash, signature FROM lexical_signatures WHERE params = ?", (index.params,)
+            )
+        }
+        changed, removed = [], []
+        for key, issue_data in all_issues_data.items():
+            text = lexical_text(issue_data)
+            digest = lexical_hash(text)
+            cached = stored.pop(key, None)
+            if cached and cached[0] == digest:
+                index.add_signature(key, np.frombuffer(cached[1], dtype=np.uint32))
+                continue
+            signature = index.add(key, text)
+            if signature is not None:
+                changed.append((key, index.params, digest, signature.tobytes()))
+            elif cached:
+                removed.append(key)
+        removed.extend(stored)
+        with conn:
+            conn.execute("DELETE FROM lexical_signatures WHERE params != ?", (index.params,))
+            conn.executemany("DELETE FROM lexical_signatures WHERE key = ?", [(key,) for key in removed])
+            conn.executemany(
+                "INSERT OR REPLACE INTO lexical_signatures (key, params, text_hash, signature) VALUES (?, ?, ?, ?)",
+                changed,
+            )
+    finally:
+        conn.close()
+    index.flush()
+    metrics.incr("lexical_signatures_computed", len(changed))
+    return index
@@ -0,0 +1,157 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from dotenv import load_dotenv
+
+load_dotenv()
+# Informe JSON por ejecución y fichero de texto Prometheus (textfile collector). Vacío = desactivado.
+METRICS_REPORT = os.getenv("METRICS_REPORT", "")
+METRICS_PROMETHEUS_FILE = os.getenv("METRICS_PROMETHEUS_FILE", "")
+METRICS_PREFIX = "jirax_"
+QUANTILES = (0.5, 0.95, 0.99)
+
+_lock = threading.Lock()
+_counters = {}
+_samples = {}
+_started = time.time()
+
+
+def _series(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def incr(name, amount=1, **labels):
+    series = _series(name, labels)
+    with _lock:
+        _counters[series] = _counters.get(series, 0) + amount
+
+
+def observe(name, value, **labels):
+    series = _series(name, labels)
+    with _lock:
+        _samples.setdefault(series, []).append(float(value))
+
+
+@contextmanager
+def timer(name, **labels):
+    """Mide la duración del bloque en `<name>_seconds`, también si termina con excepción."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(f"{name}_seconds", time.perf_counter() - started, **labels)
+
+
+def timed(name):
+    """Decorador equivalente a envolver la función en `timer(name)`."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with timer(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def reset():
+    global _started
+    with _lock:
+        _counters.clear()
+        _samples.clear()
+        _started = time.time()
+
+
+def quantile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def summarize(values):
+    values = sorted(values)
+    summary = {"count": len(values), "sum": sum(values), "min": values[0], "max": values[-1]}
+    summary.update({f"p{int(q * 100)}": quantile(values, q) for q in QUANTILES})
+    return summary
+
+
+def series_name(name, labels):
+    if not labels:
+        return name
+    return f"{name}{{{','.join(f'{k}={v}' for k, v in labels)}}}"
+
+
+def report():
+    """Informe estructurado de la ejecución: contadores y resúmenes (count/sum/min/max/cuantiles)."""
+    with _lock:
+        counters = dict(_counters)
+        samples = {series: list(values) for series, values in _samples.items()}
+    return {
+        "started": _started,
+        "duration_seconds": time.time() - _started,
+        "counters": {series_name(*series): value for series, value in sorted(counters.items())},
+        "summaries": {series_name(*series): summarize(values) for series, values in sorted(samples.items())},
+    }
+
+
+def _prometheus_labels(labels, extra=()):
+    pairs = [*labels, *extra]
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _k, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _v), v in zip(pairs, escaped)) + "}"
+
+
+def prometheus_text():
+    """Las mismas métricas en formato de exposición de texto de Prometheus."""
+    with _lock:
+        counters = dict(_counters)
+        samples = {series: sorted(values) for series, values in _samples.items()}
+    lines = []
+    typed = set()
+    for (name, labels), value in sorted(counters.items()):
+        metric = f"{METRICS_PREFIX}{name}_total"
+        if metric not in typed:
+            lines.append(f"# TYPE {metric} counter")
+            typed.add(metric)
+        lines.append(f"{metric}{_prometheus_labels(labels)} {value}")
+    for (name, labels), values in sorted(samples.items()):
+        metric = f"{METRICS_PREFIX}{name}"
+        if metric not in typed:
+            lines.append(f"# TYPE {metric} summary")
+            typed.add(metric)
+        for q in QUANTILES:
+            lines.append(f"{metric}{_prometheus_labels(labels, [('quantile', q)])} {quantile(values, q)}")
+        lines.append(f"{metric}_sum{_prometheus_labels(labels)} {sum(values)}")
+        lines.append(f"{metric}_count{_prometheus_labels(labels)} {len(values)}")
+    return "\n".join(lines) + "\n"
+
+
+def _write_text(path, text):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def print_report(run_report):
+    print(f"\n--- Metrics ({run_report['duration_seconds']:.1f}s) ---")
+    for name, summary in run_report["summaries"].items():
+        print(
+            f"{name:<48}{summary['count']:>8}  sum={summary['sum']:.3f}  "
+            f"p50={summary['p50']:.3f}  p95={summary['p95']:.3f}  max={summary['max']:.3f}"
+        )
+    for name, value in run_report["counters"].items():
+        print(f"{name:<48}{value:>8}")
+
+
+def emit_run_report(command=None):
+    """Imprime el resumen y, si están configurados, escribe METRICS_REPORT y METRICS_PROMETHEUS_FILE."""
+    run_report = report()
+    run_report["command"] = command
+    print_report(run_report)
+    if METRICS_REPORT:
+        _write_text(METRICS_REPORT, json.dumps(run_report, ensure_ascii=False, indent=2))
+    if METRICS_PROMETHEUS_FILE:
+        _write_text(METRICS_PROMETHEUS_FILE, prometheus_text())
+    return run_report
@@ -0,0 +1,157 @@
+import os
+import threading
+import time
+import requests
+from dotenv import load_dotenv
+from langchain_core.embeddings import Embeddings
+from langchain_core.runnables import RunnableLambda
+import metrics
+
+load_dotenv()
+
+
+def host_list(name, default=""):
+    return [h.strip().rstrip("/") for h in os.getenv(name, default).split(",") if h.strip()]
+
+
+# Servidores Ollama (p. ej. http://gpu1:11434,http://gpu2:11434). Vacío = el cliente por
+# defecto de langchain_ollama (OLLAMA_HOST o localhost). El chat y los embeddings pueden
+# repartirse en grupos distintos con OLLAMA_CHAT_HOSTS / OLLAMA_EMBED_HOSTS.
+OLLAMA_HOSTS = host_list("OLLAMA_HOSTS")
+OLLAMA_CHAT_HOSTS = host_list("OLLAMA_CHAT_HOSTS") or OLLAMA_HOSTS
+OLLAMA_EMBED_HOSTS = host_list("OLLAMA_EMBED_HOSTS") or OLLAMA_HOSTS
+# Un servidor caído se vuelve a comprobar (GET /api/tags) cada OLLAMA_HEALTH_INTERVAL segundos.
+OLLAMA_HEALTH_INTERVAL = float(os.getenv("OLLAMA_HEALTH_INTERVAL", "15"))
+OLLAMA_HEALTH_TIMEOUT = float(os.getenv("OLLAMA_HEALTH_TIMEOUT", "2"))
+
+
+class Backend:
+    """Un servidor Ollama del pool con su cliente de LangChain y sus peticiones en curso."""
+
+    def __init__(self, url, client):
+        self.url = url
+        self.client = client
+        self.outstanding = 0
+        self.healthy = True
+        self.next_check = 0.0
+
+
+class BackendPool:
+    """
+    Reparte las llamadas entre varios servidores Ollama: cada petición va al servidor
+    sano con menos peticiones en curso (los empates se rotan). Si una llamada falla y
+    el servidor no responde a la comprobación de salud, se marca caído y la petición
+    se reintenta en otro; si responde, el error es de la propia petición y se propaga.
+    Los servidores caídos se vuelven a comprobar cada `health_interval` segundos.
+    """
+
+    def __init__(self, name, urls, client_factory, health_interval=None, health_timeout=None):
+        if not urls:
+            raise ValueError(f"Ollama pool '{name}' needs at least one host")
+        self.name = name
+        self.backends = [Backend(url, client_factory(url)) for url in urls]
+        self.health_interval = OLLAMA_HEALTH_INTERVAL if health_interval is None else health_interval
+        self.health_timeout = OLLAMA_HEALTH_TIMEOUT if health_timeout is None else health_timeout
+        self._cursor = 0
+        self._lock = threading.Lock()
+
+    def probe(self, backend):
+        try:
+            response = requests.get(f"{backend.url}/api/tags", timeout=self.health_timeout)
+            return response.status_code == 200
+        except requests.RequestException:
+            return False
+
+    def check_down(self, force=False):
+        """Comprueba los servidores caídos cuyo plazo ha vencido (o todos con `force`) y recupera los que respondan."""
+        now = time.monotonic()
+        with self._lock:
+            due = [b for b in self.backends if not b.healthy and (force or b.next_check <= now)]
+            for backend in due:
+                # Se aplaza antes de comprobar para que otros hilos no lo comprueben a la vez.
+                backend.next_check = now + self.health_interval
+        for backend in due:
+            if self.probe(backend):
+                with self._lock:
+                    backend.healthy = True
+                print(f"Ollama {self.name} backend {backend.url} is back.")
+                metrics.incr("ollama_backend_recoveries", pool=self.name, backend=backend.url)
+
+    def mark_down(self, backend, error):
+        with self._lock:
+            if not backend.healthy:
+                return
+            backend.healthy = False
+            backend.next_check = time.monotonic() + self.health_interval
+        print(f"Ollama {self.name} backend {backend.url} is down ({error}); failing over.")
+        metrics.incr("ollama_backend_failures", pool=self.name, backend=backend.url)
+
+    def acquire(self, exclude=()):
+        """Reserva el servidor sano con menos peticiones en curso (None si no queda ninguno)."""
+        self.check_down()
+        with self._lock:
+            candidates = [b for b in self.backends if b.healthy and b not in exclude]
+            if not candidates:
+                return None
+            # Rotar el punto de partida reparte los empates (p. ej. todos a cero) entre servidores.
+            self._cursor = (self._cursor + 1) % len(candidates)
+            rotated = candidates[self._cursor:] + candidates[:self._cursor]
+            backend = min(rotated, key=lambda b: b.outstanding)
+            backend.outstanding += 1
+            return backend
+
+    def release(self, backend):
+        with self._lock:
+            backend.outstanding -= 1
+
+    def call(self, fn):
+        """Ejecuta `fn(cliente)` en el servidor elegido, con conmutación a otro si el servidor está caído."""
+        tried = set()
+        last_error = None
+        rechecked = False
+        while True:
+            backend = self.acquire(tried)
+            if backend is None and not rechecked:
+                # Sin candidatos: se comprueban ya los caídos (también los que siguen en espera,
+                # que pueden haberse recuperado) y se reintenta una vez con los que respondan.
+                rechecked = True
+                self.check_down(force=True)
+                tried = {b for b in tried if not b.healthy}
+                backend = self.acquire(tried)
+            if backend is None:
+                if last_error is not None:
+                    raise last_error
+                raise RuntimeError(f"No healthy Ollama backend in pool '{self.name}'")
+            try:
+                with metrics.timer("ollama_request", pool=self.name, backend=backend.url):
+                    return fn(backend.client)
+            except Exception as e:
+                if self.probe(backend):
+                    raise
+                self.mark_down(backend, e)
+                tried.add(backend)
+                last_error = e
+            finally:
+                self.release(backend)
+
+    def status(self):
+        with self._lock:
+            return [(b.url, b.healthy, b.outstanding) for b in self.backends]
+
+
+class PooledEmbeddings(Embeddings):
+    """Embeddings de LangChain que reparten cada lote entre los servidores del pool."""
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    def embed_documents(self, texts):
+        return self.pool.call(lambda client: client.embed_documents(texts))
+
+    def embed_query(self, text):
+        return self.pool.call(lambda client: client.embed_query(text))
+
+
+def pooled_chat(pool):
+    """Runnable equivalente a un ChatOllama que envía cada llamada a un servidor del pool."""
+    return RunnableLambda(lambda prompt_value: pool.call(lambda llm: llm.invoke(prompt_value)))
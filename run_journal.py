@@ -0,0 +1,109 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+RUN_JOURNAL_DB = os.getenv("RUN_JOURNAL_DB", "jirax_runs.db")
+COMPLETED_STATUSES = ("updated", "unchanged")
+
+
+class RunJournal:
+    """
+    Diario persistente de una ejecución de análisis: por issue guarda el veredicto
+    (claves de duplicados y payload), las actualizaciones de clúster y el resultado
+    de la escritura en Jira, para poder reanudar sin repetir trabajo terminado.
+    """
+
+    def __init__(self, path=None):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path or RUN_JOURNAL_DB, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    command TEXT NOT NULL,
+    keys_json TEXT NOT NULL,
+    started REAL NOT NULL,
+    finished REAL
+)""")
+        self._conn.execute("""
+CREATE TABLE IF NOT EXISTS run_items (
+    run_id INTEGER NOT NULL,
+    issue_key TEXT NOT NULL,
+    source TEXT NOT NULL,
+    found_dup_keys TEXT,
+    payload TEXT,
+    status TEXT NOT NULL,
+    message TEXT,
+    updated REAL NOT NULL,
+    PRIMARY KEY (run_id, issue_key)
+)""")
+        self._conn.commit()
+        self.run_id = None
+
+    def start(self, command, keys):
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO runs (command, keys_json, started) VALUES (?, ?, ?)",
+                (command, json.dumps(keys), time.time()),
+            )
+        self.run_id = cursor.lastrowid
+        return self.run_id
+
+    def resume(self, run_id=None):
+        """Retoma una ejecución (la última si no se indica). Devuelve (command, keys) o None."""
+        with self._lock:
+            if run_id is None:
+                row = self._conn.execute(
+                    "SELECT run_id, command, keys_json FROM runs ORDER BY run_id DESC LIMIT 1"
+                ).fetchone()
+            else:
+                row = self._conn.execute(
+                    "SELECT run_id, command, keys_json FROM runs WHERE run_id = ?", (run_id,)
+                ).fetchone()
+            if row is None:
+                return None
+            with self._conn:
+                self._conn.execute("UPDATE runs SET finished = NULL WHERE run_id = ?", (row[0],))
+        self.run_id = row[0]
+        return row[1], json.loads(row[2])
+
+    def finish(self):
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE runs SET finished = ? WHERE run_id = ?", (time.time(), self.run_id))
+
+    def _upsert(self, issue_key, **values):
+        columns = ", ".join(values)
+        updates = ", ".join(f"{c} = excluded.{c}" for c in values)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT INTO run_items (run_id, issue_key, updated, {columns}) "
+                f"VALUES (?, ?, ?, {', '.join('?' for _ in values)}) "
+                f"ON CONFLICT(run_id, issue_key) DO UPDATE SET updated = excluded.updated, {updates}",
+                [self.run_id, issue_key, time.time(), *values.values()],
+            )
+
+    def record_verdict(self, issue_key, found_dup_keys, payload, status, message=None):
+        self._upsert(
+            issue_key, source="analysis", found_dup_keys=json.dumps(found_dup_keys),
+            payload=payload, status=status, message=message,
+        )
+
+    def record_cluster_update(self, issue_key, cluster_source, payload):
+        self._upsert(issue_key, source=f"cluster:{cluster_source}", payload=payload, status="pending", message=None)
+
+    def record_write(self, issue_key, payload, status, message):
+        self._upsert(issue_key, payload=payload, status=status, message=message, source="write")
+
+    def completed(self):
+        """{clave: (claves de duplicados, payload, mensaje)} de los issues ya escritos (o sin cambios)."""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT issue_key, found_dup_keys, payload, message FROM run_items "
+                f"WHERE run_id = ? AND status IN ({', '.join('?' for _ in COMPLETED_STATUSES)})",
+                [self.run_id, *COMPLETED_STATUSES],
+            ).fetchall()
+        return {key: (json.loads(dups) if dups else [], payload, message) for key, dups, payload, message in rows}
@@ -0,0 +1,154 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from dotenv import load_dotenv
+from issue_store import project_of
+from vector_index import (
+    INDEX_DIR, HASHES_FILE, CONFIG_FILE, index_config, index_keys, load_vector_store,
+    stored_vectors, update_vector_store,
+)
+
+load_dotenv()
+# Ficheros de un índice guardado con FAISS.save_local, además de los hashes y la configuración.
+INDEX_FILES = ("index.faiss", "index.pkl", HASHES_FILE, CONFIG_FILE)
+
+
+class ProjectView:
+    """Vista de solo lectura de los issues de un proyecto sobre la IssueTable (o IssueStore) completa."""
+
+    def __init__(self, all_issues_data, project):
+        self.all_issues_data = all_issues_data
+        self.project = project
+
+    def get(self, key, default=None):
+        if project_of(key) != self.project:
+            return default
+        return self.all_issues_data.get(key, default)
+
+    def keys(self):
+        return [key for key in self.all_issues_data.keys() if project_of(key) == self.project]
+
+    def items(self):
+        for key, issue_data in self.all_issues_data.items():
+            if project_of(key) == self.project:
+                yield key, issue_data
+
+
+def migrate_legacy_index(root, project):
+    """Mueve el índice único de versiones anteriores (en la raíz de INDEX_DIR) al shard de `project`."""
+    target = os.path.join(root, project)
+    if not os.path.exists(os.path.join(root, HASHES_FILE)) or os.path.exists(target):
+        return
+    os.makedirs(target)
+    for name in INDEX_FILES:
+        if os.path.exists(os.path.join(root, name)):
+            os.replace(os.path.join(root, name), os.path.join(target, name))
+    print(f"Moved the existing vector store to the {project} shard ({target}).")
+
+
+class ShardedIndex:
+    """
+    Memoria vectorial repartida en un índice FAISS por proyecto (INDEX_DIR/<PROYECTO>),
+    cada uno con sus hashes y su configuración: se cargan, actualizan y guardan por
+    separado, así que refrescar un proyecto no reconstruye los demás.
+    Los ids globales concatenan los de cada shard en el orden de `projects`
+    (desplazamiento del shard + id local); las búsquedas se reparten en paralelo
+    entre los shards seleccionados y se mezclan los k mejores por distancia.
+    """
+
+    def __init__(self, embeddings, projects, root=INDEX_DIR):
+        self.embeddings = embeddings
+        self.projects = list(projects)
+        self.root = root
+        self.shards = {}
+        self.hashes = {}
+        self.configs = {}
+        self._offsets = {}
+        self._keys = []
+        self._pool = ThreadPoolExecutor(max_workers=max(1, len(self.projects)))
+
+    def path(self, project):
+        return os.path.join(self.root, project)
+
+    def load(self):
+        """Carga los shards guardados en disco."""
+        if self.projects:
+            migrate_legacy_index(self.root, self.projects[0])
+        for project in self.projects:
+            vector_store, hashes, config = load_vector_store(self.embeddings, self.path(project))
+            if vector_store is not None:
+                self.shards[project], self.hashes[project], self.configs[project] = vector_store, hashes, config
+        self._reindex()
+        return self
+
+    def update(self, all_issues_data, keys=None, projects=None):
+        """
+        Aplica a cada shard de `projects` (por defecto todos) los cambios de sus issues;
+        los shards sin cambios no se tocan. Con `keys`, como en update_vector_store, solo
+        se recalculan esas claves. Devuelve las claves embebidas.
+        """
+        embedded = []
+        for project in projects or self.projects:
+            # Un shard que aún no existe se construye con todos los issues de su proyecto.
+            shard_keys = None if keys is None or project not in self.shards else [k for k in keys if project_of(k) == project]
+            print(f"Shard {project} ({self.path(project)}):")
+            vector_store, hashes, shard_embedded = update_vector_store(
+                self.shards.get(project), self.hashes.get(project, {}), self.configs.get(project),
+                ProjectView(all_issues_data, project), self.embeddings, self.path(project), keys=shard_keys,
+            )
+            if vector_store is None:
+                self.shards.pop(project, None)
+                self.hashes.pop(project, None)
+                continue
+            self.shards[project], self.hashes[project] = vector_store, hashes
+            self.configs[project] = index_config()
+            embedded.extend(shard_embedded)
+        self._reindex()
+        return embedded
+
+    def _reindex(self):
+        self._offsets, self._keys = {}, []
+        for project in self.projects:
+            if project in self.shards:
+                self._offsets[project] = len(self._keys)
+                self._keys.extend(index_keys(self.shards[project]))
+
+    def __len__(self):
+        return len(self._keys)
+
+    def keys(self):
+        """Claves de todos los shards en orden de id global."""
+        return list(self._keys)
+
+    def vectors(self):
+        """Matriz float32 con los vectores de todos los shards, en orden de id global."""
+        shards = [self.shards[p] for p in self.projects if p in self.shards]
+        if not shards:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.vstack([stored_vectors(shard) for shard in shards])
+
+    def search(self, vectors, k, projects=None):
+        """
+        Como `index.search` de FAISS sobre la unión de los shards de `projects` (por
+        defecto todos): devuelve (distancias, ids globales), -1 donde no hay vecino.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        selected = [p for p in (projects or self.projects) if p in self.shards]
+        if not selected:
+            return np.full((len(vectors), k), np.inf, dtype=np.float32), np.full((len(vectors), k), -1, dtype=np.int64)
+
+        def search_shard(project):
+            distances, ids = self.shards[project].index.search(vectors, k)
+            return distances, np.where(ids >= 0, ids + self._offsets[project], -1)
+
+        # FAISS libera el GIL durante la búsqueda: los shards se consultan a la vez.
+        results = list(self._pool.map(search_shard, selected)) if len(selected) > 1 else [search_shard(selected[0])]
+        ids = np.hstack([ids for _distances, ids in results])
+        distances = np.where(ids >= 0, np.hstack([distances for distances, _ids in results]), np.inf)
+        order = np.argsort(distances, axis=1, kind="stable")[:, :k]
+        return np.take_along_axis(distances, order, axis=1), np.take_along_axis(ids, order, axis=1)
+
+    def search_ids(self, query_vector, k, projects=None):
+        """Los k vecinos más cercanos de un vector en los shards seleccionados: [(id global, distancia)]."""
+        distances, ids = self.search([query_vector], k, projects)
+        return [(int(i), float(d)) for i, d in zip(ids[0], distances[0]) if i >= 0]
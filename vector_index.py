@@ -0,0 +1,369 @@
+import hashlib
+import json
+import os
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import numpy as np
+from dotenv import load_dotenv
+import metrics
+
+# faiss y langchain_community se importan dentro de las funciones que los usan:
+# cuestan segundos y los comandos que no tocan el índice no deben pagarlos.
+
+load_dotenv()
+INDEX_DIR = os.getenv("INDEX_DIR", "ucm_faiss_index")
+HASHES_FILE = "content_hashes.json"
+CONFIG_FILE = "index_config.json"
+# Tipo de índice: flat (exacto), ivf (IVF-Flat), ivfpq (IVF-PQ) o hnsw.
+INDEX_TYPE = os.getenv("INDEX_TYPE", "flat").lower()
+IVF_NLIST = int(os.getenv("IVF_NLIST", "0"))  # 0 = automático (4·√N)
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", "8"))
+PQ_M = int(os.getenv("PQ_M", "16"))
+PQ_NBITS = int(os.getenv("PQ_NBITS", "8"))
+HNSW_M = int(os.getenv("HNSW_M", "32"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "80"))
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "64"))
+EMBED_BATCH_SIZE = max(1, int(os.getenv("EMBED_BATCH_SIZE", "64")))
+EMBED_WORKERS = max(1, int(os.getenv("EMBED_WORKERS", "2")))
+
+
+def issue_content(issue_data):
+    """Texto que se embebe para un issue (y que se usa como consulta)."""
+    return f"Summary: {issue_data.get('summary', '')}\nDescription: {issue_data.get('customfield_10193', '')}"
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def index_config():
+    """Parámetros estructurales del índice configurado (si cambian, el índice se reconstruye)."""
+    if INDEX_TYPE == "ivf":
+        return {"type": "ivf", "nlist": IVF_NLIST}
+    if INDEX_TYPE == "ivfpq":
+        return {"type": "ivfpq", "nlist": IVF_NLIST, "pq_m": PQ_M, "pq_nbits": PQ_NBITS}
+    if INDEX_TYPE == "hnsw":
+        return {"type": "hnsw", "m": HNSW_M, "ef_construction": HNSW_EF_CONSTRUCTION}
+    return {"type": "flat"}
+
+
+def is_flat(index):
+    import faiss
+    return isinstance(index, faiss.IndexFlat)
+
+
+def create_index(d, n):
+    """Crea un índice vacío del tipo configurado, o None si no hay vectores suficientes para entrenarlo."""
+    import faiss
+    if INDEX_TYPE == "hnsw":
+        index = faiss.IndexHNSWFlat(d, HNSW_M)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        return index
+    if INDEX_TYPE in ("ivf", "ivfpq"):
+        # FAISS recomienda al menos 39 vectores de entrenamiento por lista.
+        nlist = min(IVF_NLIST or int(4 * math.sqrt(n)), n // 39)
+        if nlist < 1:
+            return None
+        quantizer = faiss.IndexFlatL2(d)
+        if INDEX_TYPE == "ivf":
+            return faiss.IndexIVFFlat(quantizer, d, nlist)
+        if d % PQ_M != 0:
+            print(f"Warning: PQ_M={PQ_M} does not divide dimension {d}; using IVF-Flat.")
+            return faiss.IndexIVFFlat(quantizer, d, nlist)
+        if n < 2 ** PQ_NBITS:
+            return None
+        return faiss.IndexIVFPQ(quantizer, d, nlist, PQ_M, PQ_NBITS)
+    return faiss.IndexFlatL2(d)
+
+
+def index_keys(vector_store):
+    """Claves de los vectores del índice en orden de id de FAISS."""
+    return [vector_store.index_to_docstore_id[i] for i in range(vector_store.index.ntotal)]
+
+
+def apply_search_params(vector_store):
+    """Aplica los ajustes de recall/latencia (nprobe, efSearch) al índice cargado."""
+    import faiss
+    ivf = faiss.try_extract_index_ivf(vector_store.index)
+    if ivf is not None:
+        ivf.nprobe = min(IVF_NPROBE, ivf.nlist)
+    if hasattr(vector_store.index, "hnsw"):
+        vector_store.index.hnsw.efSearch = HNSW_EF_SEARCH
+
+
+def stored_vectors(vector_store):
+    """
+    Vectores del índice en orden de id. Son exactos salvo en IVF-PQ, donde
+    se vuelven a pedir al modelo de embeddings (normalmente aciertos de caché).
+    """
+    import faiss
+    index = vector_store.index
+    if index.ntotal == 0:
+        return np.zeros((0, index.d), dtype=np.float32)
+    ivf = faiss.try_extract_index_ivf(index)
+    if isinstance(ivf, faiss.IndexIVFPQ):
+        texts = [
+            vector_store.docstore.search(vector_store.index_to_docstore_id[i]).page_content
+            for i in range(index.ntotal)
+        ]
+        return np.asarray(vector_store.embedding_function.embed_documents(texts), dtype=np.float32)
+    if ivf is not None:
+        ivf.make_direct_map()
+    return index.reconstruct_n(0, index.ntotal)
+
+
+@metrics.timed("index_rebuild")
+def rebuild_index(vector_store, flat=False):
+    """Reconstruye el índice FAISS (del tipo configurado o plano) conservando el orden de ids."""
+    import faiss
+    vectors = stored_vectors(vector_store)
+    index = faiss.IndexFlatL2(vector_store.index.d) if flat else create_index(vector_store.index.d, len(vectors))
+    if index is None:
+        print(f"Not enough vectors ({len(vectors)}) to train a {INDEX_TYPE} index yet; keeping a flat index.")
+        index = faiss.IndexFlatL2(vector_store.index.d)
+    if not index.is_trained:
+        print(f"Training {INDEX_TYPE} index on {len(vectors)} vectors...")
+        index.train(vectors)
+    index.add(vectors)
+    vector_store.index = index
+    apply_search_params(vector_store)
+
+
+def remove_keys(vector_store, keys):
+    """
+    Borra claves del índice. En IVF e IVF-PQ se quitan de las listas invertidas sin
+    reentrenar (los centroides siguen valiendo) y los ids restantes se renumeran a 0..n-1,
+    el orden en que LangChain deja su mapa tras borrar. HNSW no admite borrados: se pasa
+    a plano y update_vector_store() lo reconstruye entero al final (todos los vectores
+    se vuelven a insertar en el grafo, un coste O(N log N) en cada ciclo con bajas o cambios).
+    """
+    import faiss
+    ivf = faiss.try_extract_index_ivf(vector_store.index)
+    if ivf is None:
+        if not is_flat(vector_store.index):
+            rebuild_index(vector_store, flat=True)
+        vector_store.delete(ids=keys)
+        return
+    key_to_id = {key: i for i, key in vector_store.index_to_docstore_id.items()}
+    dropped = np.array(sorted(key_to_id[key] for key in keys), dtype=np.int64)
+    # El mapa directo (lo crea stored_vectors) impide borrar y quedaría desfasado al renumerar.
+    ivf.make_direct_map(False)
+    vector_store.delete(ids=keys)
+    for list_no in range(ivf.nlist):
+        size = ivf.invlists.list_size(list_no)
+        if size:
+            ids = faiss.rev_swig_ptr(ivf.invlists.get_ids(list_no), size)
+            ids -= np.searchsorted(dropped, ids)
+
+
+def can_build_ann(n):
+    if INDEX_TYPE == "hnsw":
+        return True
+    if INDEX_TYPE == "ivf":
+        return n >= 39
+    if INDEX_TYPE == "ivfpq":
+        return n >= max(39, 2 ** PQ_NBITS)
+    return False
+
+
+def load_vector_store(embeddings, path=INDEX_DIR):
+    """
+    Carga el índice FAISS, los hashes y la configuración guardados.
+    Devuelve (None, {}, None) si no hay nada válido.
+    """
+    from langchain_community.vectorstores import FAISS
+    hashes_path = os.path.join(path, HASHES_FILE)
+    if not os.path.exists(hashes_path):
+        return None, {}, None
+    try:
+        with metrics.timer("index_load"):
+            vector_store = FAISS.load_local(path, embeddings, allow_dangerous_deserialization=True)
+        with open(hashes_path, "r", encoding="utf-8") as f:
+            hashes = json.load(f)
+        config_path = os.path.join(path, CONFIG_FILE)
+        config = {"type": "flat"}
+        if os.path.exists(config_path):
+            with open(config_path, "r", encoding="utf-8") as f:
+                config = json.load(f)
+    except Exception as e:
+        print(f"Warning: Could not load persisted vector store ({e}). Rebuilding.")
+        return None, {}, None
+    if set(hashes) != set(vector_store.index_to_docstore_id.values()):
+        print("Warning: Persisted vector store and content hashes are out of sync. Rebuilding.")
+        return None, {}, None
+    apply_search_params(vector_store)
+    return vector_store, hashes, config
+
+
+def _write_json(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+@metrics.timed("index_save")
+def save_vector_store(vector_store, hashes, path=INDEX_DIR):
+    vector_store.save_local(path)
+    _write_json(os.path.join(path, CONFIG_FILE), index_config())
+    _write_json(os.path.join(path, HASHES_FILE), hashes)
+
+
+def embed_in_batches(keys, all_issues_data, embeddings, on_batch):
+    """
+    Embebe los issues en lotes de EMBED_BATCH_SIZE con como mucho EMBED_WORKERS
+    peticiones simultáneas. Cada lote terminado se entrega a `on_batch(keys, texts, vectors)`
+    en el hilo llamador, así que solo hay en memoria los lotes en curso.
+    """
+    total = len(keys)
+    done = 0
+    started = time.monotonic()
+    batches = (keys[i:i + EMBED_BATCH_SIZE] for i in range(0, total, EMBED_BATCH_SIZE))
+    pending = {}
+
+    def submit_next(pool):
+        batch_keys = next(batches, None)
+        if batch_keys is None:
+            return False
+        texts = [issue_content(all_issues_data.get(k)) for k in batch_keys]
+        pending[pool.submit(embeddings.embed_documents, texts)] = (batch_keys, texts)
+        return True
+
+    with ThreadPoolExecutor(max_workers=EMBED_WORKERS) as pool:
+        for _ in range(EMBED_WORKERS * 2):
+            if not submit_next(pool):
+                break
+        while pending:
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                batch_keys, texts = pending.pop(future)
+                on_batch(batch_keys, texts, future.result())
+                done += len(batch_keys)
+                elapsed = time.monotonic() - started
+                print(f"Embedded {done}/{total} issues ({done / elapsed if elapsed else 0:.1f} issues/s).")
+                submit_next(pool)
+
+def update_vector_store(vector_store, stored_hashes, stored_config, all_issues_data, embeddings,
+                        path=INDEX_DIR, keys=None):
+    """
+    Aplica al índice (ya cargado) los cambios de `all_issues_data` respecto a `stored_hashes`
+    y lo guarda. Con `keys` solo se recalculan los hashes de esas claves; del resto solo
+    se comprueba que sigan existiendo. Devuelve (índice, hashes, claves embebidas).
+    """
+    from langchain_community.vectorstores import FAISS
+    if keys is None:
+        current_hashes = {
+            key: content_hash(issue_content(issue_data))
+            for key, issue_data in all_issues_data.items()
+        }
+    else:
+        live_keys = set(all_issues_data.keys())
+        current_hashes = {key: h for key, h in stored_hashes.items() if key in live_keys}
+        for key in keys:
+            issue_data = all_issues_data.get(key)
+            if issue_data is not None:
+                current_hashes[key] = content_hash(issue_content(issue_data))
+    if not current_hashes:
+        return None, {}, []
+
+    config_changed = vector_store is not None and stored_config != index_config()
+    deleted = [k for k in stored_hashes if k not in current_hashes]
+    changed = [k for k, h in stored_hashes.items() if k in current_hashes and current_hashes[k] != h]
+    added = [k for k in current_hashes if k not in stored_hashes]
+    print(
+        f"Vector store: {len(current_hashes)} issues "
+        f"({len(added)} new, {len(changed)} changed, {len(deleted)} removed)."
+    )
+    removed = deleted + changed
+    to_embed = added + changed
+    wants_ann = INDEX_TYPE != "flat"
+    pending_ann = (
+        vector_store is not None and wants_ann and is_flat(vector_store.index)
+        and can_build_ann(len(current_hashes))
+    )
+    if not removed and not to_embed and not config_changed and not pending_ann:
+        print("Vector store is up to date (no changes).")
+        return vector_store, current_hashes, []
+
+    if vector_store is not None and removed:
+        remove_keys(vector_store, removed)
+
+    def add_batch(batch_keys, texts, vectors):
+        nonlocal vector_store
+        text_embeddings = list(zip(texts, vectors))
+        metadatas = [{"key": key} for key in batch_keys]
+        if vector_store is None:
+            vector_store = FAISS.from_embeddings(text_embeddings, embeddings, metadatas=metadatas, ids=batch_keys)
+        else:
+            vector_store.add_embeddings(text_embeddings, metadatas=metadatas, ids=batch_keys)
+
+    embed_in_batches(to_embed, all_issues_data, embeddings, add_batch)
+
+    if config_changed or (wants_ann and is_flat(vector_store.index) and can_build_ann(vector_store.index.ntotal)):
+        rebuild_index(vector_store, flat=not wants_ann)
+
+    save_vector_store(vector_store, current_hashes, path)
+    print("Vector store updated and saved successfully.")
+    return vector_store, current_hashes, to_embed
+
+
+def recall_report(vector_store, k=10, sample_size=200, seed=0):
+    """
+    Compara el índice configurado con la búsqueda exacta (plana) sobre una muestra
+    de los propios vectores: recall@k y milisegundos por consulta para varios
+    valores de nprobe (IVF) o efSearch (HNSW). Devuelve las filas del informe.
+    """
+    import faiss
+    vectors = stored_vectors(vector_store)
+    n = len(vectors)
+    if n == 0:
+        print("Vector store is empty; nothing to report.")
+        return []
+    k = min(k, n)
+    rng = np.random.default_rng(seed)
+    queries = vectors[rng.choice(n, size=min(sample_size, n), replace=False)]
+
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    started = time.perf_counter()
+    _, truth = exact.search(queries, k)
+    rows = [("flat", "-", 1.0, (time.perf_counter() - started) * 1000 / len(queries))]
+
+    index = vector_store.index
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        knob, values = "nprobe", sorted({v for v in (1, 2, 4, 8, 16, 32, 64, 128, IVF_NPROBE) if v <= ivf.nlist})
+        setter = lambda v: setattr(ivf, "nprobe", v)
+    elif hasattr(index, "hnsw"):
+        knob, values = "efSearch", sorted({16, 32, 64, 128, 256, HNSW_EF_SEARCH})
+        setter = lambda v: setattr(index.hnsw, "efSearch", v)
+    else:
+        knob, values, setter = None, [], None
+
+    for value in values:
+        setter(value)
+        started = time.perf_counter()
+        _, found = index.search(queries, k)
+        latency_ms = (time.perf_counter() - started) * 1000 / len(queries)
+        recall = float(np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)]))
+        rows.append((type(index).__name__, f"{knob}={value}", recall, latency_ms))
+    apply_search_params(vector_store)
+
+    print(f"Recall@{k} vs exact search ({len(queries)} queries over {n} vectors):")
+    print(f"{'index':<16}{'setting':<16}{'recall':>8}{'ms/query':>12}")
+    for name, setting, recall, latency_ms in rows:
+        print(f"{name:<16}{setting:<16}{recall:>8.3f}{latency_ms:>12.3f}")
+    return rows
+
+
+if __name__ == "__main__":
+    import clients
+    from fetcher_sql import PROJECT_KEYS
+    from sharded_index import ShardedIndex
+    sharded = ShardedIndex(clients.get("embeddings"), PROJECT_KEYS).load()
+    if not sharded.shards:
+        print(f"No persisted vector store found in {INDEX_DIR}.")
+    for project, vector_store in sharded.shards.items():
+        print(f"\nShard {project}:")
+        recall_report(vector_store)
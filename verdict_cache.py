@@ -0,0 +1,59 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+VERDICT_CACHE_DB = os.getenv("VERDICT_CACHE_DB", "jirax_cache.db")
+
+
+def verdict_key(llm_model, template_version, current_issue_context, neighbors):
+    """
+    Clave de un veredicto: modelo, versión de la plantilla, hash del contexto del
+    issue actual y los vecinos recuperados como pares (clave, hash de contenido).
+    """
+    material = json.dumps(
+        [
+            llm_model,
+            template_version,
+            hashlib.sha256(current_issue_context.encode("utf-8")).hexdigest(),
+            sorted(neighbors),
+        ],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class VerdictCache:
+    """Caché persistente del valor de `customfield_10602` devuelto por el LLM."""
+
+    def __init__(self, path=None):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path or VERDICT_CACHE_DB, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+CREATE TABLE IF NOT EXISTS verdicts (
+    verdict_key TEXT PRIMARY KEY,
+    issue_key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    created REAL NOT NULL
+)""")
+        self._conn.commit()
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM verdicts WHERE verdict_key = ?", (key,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def put(self, key, issue_key, value):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO verdicts (verdict_key, issue_key, value, created) VALUES (?, ?, ?, ?)",
+                (key, issue_key, value, time.time()),
+            )
+            self._conn.commit()
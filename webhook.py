@@ -0,0 +1,87 @@
+import hmac
+import json
+import os
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from dotenv import load_dotenv
+from issue_store import ISSUE_KEY_PATTERN
+
+load_dotenv()
+WATCH_WEBHOOK_HOST = os.getenv("WATCH_WEBHOOK_HOST", "127.0.0.1")
+WATCH_WEBHOOK_PATH = os.getenv("WATCH_WEBHOOK_PATH", "/webhook")
+# Secreto opcional: se espera en `?secret=` (como permite configurar Jira) o en la cabecera X-Jirax-Secret.
+WATCH_WEBHOOK_SECRET = os.getenv("WATCH_WEBHOOK_SECRET", "")
+ISSUE_KEY_RE = re.compile(rf"^{ISSUE_KEY_PATTERN}$")
+
+
+def webhook_keys(body):
+    """Claves de issue de un webhook de Jira (`issue.key`) o de un cuerpo `{"keys": [...]}`."""
+    keys = set()
+    issue = body.get("issue") if isinstance(body, dict) else None
+    if isinstance(issue, dict) and isinstance(issue.get("key"), str):
+        keys.add(issue["key"].upper())
+    if isinstance(body, dict) and isinstance(body.get("keys"), list):
+        keys.update(k.upper() for k in body["keys"] if isinstance(k, str))
+    return {k for k in keys if ISSUE_KEY_RE.match(k)}
+
+
+class WebhookServer:
+    """
+    Servidor HTTP local que recibe webhooks de Jira por POST y llama a
+    `on_event(claves)` para despertar al modo vigilancia; responde 202 enseguida.
+    """
+
+    def __init__(self, on_event, port, host=None, path=None, secret=None):
+        self.on_event = on_event
+        self.path = path or WATCH_WEBHOOK_PATH
+        self.secret = WATCH_WEBHOOK_SECRET if secret is None else secret
+        self.server = ThreadingHTTPServer((host or WATCH_WEBHOOK_HOST, port), self._handler_class())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        host, port = self.server.server_address[:2]
+        print(f"Webhook listening on http://{host}:{port}{self.path}")
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def authorized(self, query, headers):
+        if not self.secret:
+            return True
+        provided = (query.get("secret") or [headers.get("X-Jirax-Secret", "")])[0]
+        return hmac.compare_digest(provided.encode("utf-8"), self.secret.encode("utf-8"))
+
+    def _handler_class(self):
+        webhook = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _reply(self, status):
+                self.send_response(status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def do_POST(self):
+                url = urlparse(self.path)
+                if url.path != webhook.path:
+                    return self._reply(404)
+                if not webhook.authorized(parse_qs(url.query), self.headers):
+                    return self._reply(403)
+                length = int(self.headers.get("Content-Length") or 0)
+                try:
+                    body = json.loads(self.rfile.read(length) or b"{}")
+                except json.JSONDecodeError:
+                    return self._reply(400)
+                webhook.on_event(webhook_keys(body))
+                self._reply(202)
+
+        return Handler